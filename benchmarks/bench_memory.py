@@ -0,0 +1,112 @@
+"""Peak RSS of a large synthetic search result, before and after the lean item types.
+
+"legacy" rebuilds the old representation: plain dataclass items with a language list
+and a separate URL string per row, a materialized candidate list and sorted copies
+for the download plan. "current" uses the frozen, slotted items (interned URLs,
+``Language`` bit set) streamed from the index into ``download_plan``.
+Each variant runs in a fresh interpreter so ``ru_maxrss`` is its own peak.
+
+    PYTHONPATH=src python benchmarks/bench_memory.py --items 200000
+"""
+from __future__ import annotations
+import argparse
+import resource
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from samfunny.cache import item_from_dict
+from samfunny.episodes import EpisodeIndex
+from samfunny.pipeline import download_plan
+from samfunny.scoring import _format_score
+from samfunny.types import Language, MediaInfo, SubFormat
+
+ROWS_PER_PAGE = 20
+
+
+@dataclass
+class LegacyItem:
+    detail_url: str
+    download_url: str
+    filename_text: str
+    languages: list
+    format: SubFormat
+    referer: str
+    is_bilingual: bool
+    download_count: Optional[int] = None
+    size_text: Optional[str] = None
+    source_text: Optional[str] = None
+    score_hint: int = 0
+
+
+def _rows(n: int) -> Iterator[dict]:
+    """Serialized items as the cache stores them; URL strings are built per row like JSON decoding does."""
+    for i in range(n):
+        page = i // ROWS_PER_PAGE
+        detail = f"https://www.samfunny.com/download/{100000 + page}.html"
+        ext = "ass" if i % 2 else "srt"
+        yield {
+            "detail_url": detail,
+            "download_url": f"https://www.samfunny.com/download/token{i}/{i}.sub",
+            "filename_text": f"Show.S{1 + page % 5:02d}E{1 + i % 24:02d}.1080p.WEB-DL.chs&eng.{ext}",
+            "languages": ["BILINGUAL", "SIMPLIFIED"] if i % 3 else ["ENGLISH"],
+            "format": ext.upper(),
+            "referer": f"https://www.samfunny.com/download/{100000 + page}.html",
+            "is_bilingual": bool(i % 3),
+            "download_count": i % 997,
+        }
+
+
+def _legacy_from_dict(d: dict) -> LegacyItem:
+    return LegacyItem(
+        detail_url=d["detail_url"], download_url=d["download_url"], filename_text=d["filename_text"],
+        languages=[Language[n] for n in d["languages"]], format=SubFormat[d["format"]],
+        referer=d["referer"], is_bilingual=d["is_bilingual"], download_count=d["download_count"],
+    )
+
+
+def _legacy_plan(results: List[LegacyItem], prefer_format: str) -> list:
+    zips = [it for it in results if it.format == SubFormat.ZIP or ".zip" in it.filename_text.lower()]
+    directs = [it for it in results if it.format in (SubFormat.SRT, SubFormat.ASS)
+               or any(ext in it.filename_text.lower() for ext in (".srt", ".ass"))]
+    zips = sorted(zips, key=lambda it: -(it.download_count or 0))[:3]
+    directs = sorted(directs, key=lambda it: (-_format_score(it.format, prefer_format), -(it.download_count or 0)))[:3]
+    return zips + directs
+
+
+def _max_rss_mib() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_variant(variant: str, n: int):
+    baseline = _max_rss_mib()
+    media = MediaInfo("Show", None, None, None)  # a movie-style search: every item is a candidate
+    if variant == "legacy":
+        index = EpisodeIndex([_legacy_from_dict(d) for d in _rows(n)])
+        plan = _legacy_plan(index.candidates(media), "ass")
+    else:
+        index = EpisodeIndex(item_from_dict(d) for d in _rows(n))
+        plan = download_plan(index.iter_candidates(media), "ass")
+    assert len(index) == n and plan
+    peak = _max_rss_mib()
+    print(f"{variant:8s} peak RSS {peak:8.1f} MiB  (+{peak - baseline:.1f} MiB over baseline)")
+
+
+def main(argv: List[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--items", type=int, default=200_000, help="Synthetic result set size")
+    p.add_argument("--variant", choices=["legacy", "current"], help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+    if args.variant:
+        run_variant(args.variant, args.items)
+        return 0
+    print(f"{args.items} items, {ROWS_PER_PAGE} per detail page")
+    for variant in ("legacy", "current"):
+        subprocess.run([sys.executable, __file__, "--items", str(args.items), "--variant", variant], check=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -17,6 +17,9 @@ setup(
     package_dir={'': 'src'},
     py_modules=['cli'],
     install_requires=requirements,
+    extras_require={
+        'async': ['httpx[http2]'],
+    },
     entry_points={
         'console_scripts': [
             'zimu = cli:main',
@@ -27,5 +30,5 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.10',
 )
@@ -1,14 +1,20 @@
 import argparse
+import asyncio
 import os
 import sys
 from pathlib import Path
 from typing import List
 
-from samfunny.filename_parser import parse_media_info
 from samfunny.client import SamfunnyClient
-from samfunny.scoring import choose_best_subtitle, _format_score
-from samfunny.downloader import download_and_place
-from samfunny.types import SubFormat
+from samfunny.types import MediaInfo
+from samfunny.pipeline import process_media, process_media_async
+from samfunny.service import serve
+from samfunny.cache import ResultCache, default_cache_dir, series_key
+from samfunny.scheduler import Budget, RunState, parse_duration, schedule
+from samfunny.langcheck import parse_language_list
+from samfunny.indexer import ParseCache, index_library
+from samfunny.queries import QueryMemory
+from samfunny.store import BatchWriter, cleanup_temp_files
 
 
 VIDEO_EXTS = {".mp4", ".mkv", ".avi", ".mov", ".m4v", ".ts", ".webm"}
@@ -46,11 +52,47 @@ def build_arg_parser() -> argparse.ArgumentParser:
     p.add_argument("--dry-run", action="store_true", help="Print planned actions without network downloads")
     p.add_argument("--verbose", action="store_true", help="Verbose logging")
     p.add_argument("--recursive", "-r", action="store_true", help="Recursively search all subdirectories")
+    p.add_argument("--cache-dir", type=Path, default=None, help="Directory for cached subtitle choices (default: ~/.cache/zimu)")
+    p.add_argument("--no-cache", action="store_true", help="Do not reuse or record cached subtitles")
+    p.add_argument("--deadline", type=parse_duration, default=None, help="Stop starting new files after this long, e.g. 3600, 45m, 2h")
+    p.add_argument("--max-requests", type=int, default=None, help="Stop starting new files after this many HTTP requests")
+    p.add_argument(
+        "--accept-lang",
+        type=parse_language_list,
+        default="bilingual,simplified",
+        help="Comma-separated language tiers a downloaded subtitle must contain "
+             "(bilingual, simplified, english, traditional) or 'any' to skip the check",
+    )
+    p.add_argument(
+        "--engine",
+        choices=["sync", "async"],
+        default="sync",
+        help="HTTP engine: one request at a time (sync) or asyncio with several files in flight (async, needs httpx)",
+    )
+    p.add_argument("--concurrency", type=int, default=8, help="Files in flight with --engine async")
+    p.add_argument("--index-workers", type=int, default=None, help="Processes for parsing file names (default: CPU count)")
+    p.add_argument("--serve", action="store_true", help="Run a local HTTP/JSON subtitle service instead of scanning")
+    p.add_argument("--host", default="127.0.0.1", help="Address for --serve")
+    p.add_argument("--port", type=int, default=8765, help="Port for --serve")
     return p
 
 
 def main(argv: List[str] | None = None) -> int:
-    args = build_arg_parser().parse_args(argv)
+    p = build_arg_parser()
+    args = p.parse_args(argv)
+    if args.engine == "async":
+        from samfunny import aio_client
+        if aio_client.httpx is None:
+            p.error("--engine async needs httpx: pip install 'httpx[http2]'")
+
+    if args.serve:
+        cache_dir = args.cache_dir or default_cache_dir()
+        client = SamfunnyClient(rate_limit=args.rate_limit, verbose=args.verbose,
+                                query_memory=QueryMemory(cache_dir / "queries.json"))
+        cache = None if args.no_cache else ResultCache(cache_dir)
+        serve(client, cache, host=args.host, port=args.port, max_pages=args.max_pages,
+              prefer_format=args.prefer_format, verbose=args.verbose, accept_languages=args.accept_lang)
+        return 0
 
     root = Path(os.getcwd())
     media_files = find_media_files(root, recursive=args.recursive)
@@ -59,82 +101,151 @@ def main(argv: List[str] | None = None) -> int:
         print("No media files found in current directory.")
         return 0
 
-    client = SamfunnyClient(rate_limit=args.rate_limit, verbose=args.verbose)
-
-    for media in media_files:
-        # 跳过sample开头的视频文件
-        if media.name.lower().startswith('sample'):
-            print(f"\n>>> Skipping: {media.name} (sample file)")
-            continue
-        
-        # 检查是否已经有字幕文件
-        ass_path = media.with_suffix('.ass')
-        srt_path = media.with_suffix('.srt')
-        if ass_path.exists() or srt_path.exists():
-            print(f"\n>>> Skipping: {media.name} (subtitle already exists)")
-            continue
-        
-        print(f"\n>>> Processing: {media.name}")
-        info = parse_media_info(media)
-        if args.verbose:
-            print(f"Parsed: title={info.title}, year={info.year}, episode={info.episode_str}")
-
-        print(f"Search query used for Samfunny: {info.title}")
-        try:
-            results = client.search_and_collect(info, max_pages=args.max_pages)
-        except Exception as e:
-            print(f"Search failed for {media.name}: {e}")
-            continue
-
-        if not results:
-            print("No subtitles found on Samfunny.")
-            continue
-
-        # Separate zip files and direct downloads for better handling
-        zip_subtitles = [item for item in results if item.format == SubFormat.ZIP or '.zip' in item.filename_text.lower()]
-        direct_subtitles = [item for item in results if item.format in (SubFormat.SRT, SubFormat.ASS) or any(ext in item.filename_text.lower() for ext in ['.srt', '.ass'])]
-        
-        # First try all zip files, they are more reliable
-        for i, sub_item in enumerate(sorted(zip_subtitles, key=lambda it: (
-            -it.download_count if it.download_count else 0
-        ))[:3]):
-            if args.dry_run:
-                print(f"[DRY-RUN] Would download: {sub_item.filename_text} ({sub_item.format}) from {sub_item.detail_url}")
-                continue
-
-            try:
-                print(f"Trying ZIP subtitle {i+1}/3: {sub_item.filename_text}")
-                out_path = download_and_place(client.session, sub_item, media)
-                print(f"Saved: {out_path}")
-                break  # Success! Move to next media file
-            except Exception as e:
-                print(f"ZIP download failed for {sub_item.filename_text}: {e}")
-                continue
-        else:
-            # If no zip success, try direct downloads
-            for i, sub_item in enumerate(sorted(direct_subtitles, key=lambda it: (
-                -_format_score(it.format, args.prefer_format),
-                -it.download_count if it.download_count else 0
-            ))[:3]):
-                if args.dry_run:
-                    print(f"[DRY-RUN] Would download: {sub_item.filename_text} ({sub_item.format}) from {sub_item.detail_url}")
-                    continue
-
-                try:
-                    print(f"Trying direct subtitle {i+1}/3: {sub_item.filename_text}")
-                    out_path = download_and_place(client.session, sub_item, media)
-                    print(f"Saved: {out_path}")
-                    break  # Success! Move to next media file
-                except Exception as e:
-                    print(f"Direct download failed for {sub_item.filename_text}: {e}")
-                    continue
-            else:
-                # All attempts failed
-                print(f"All subtitle attempts failed for {media.name}")
-                continue
-
+    cache_dir = args.cache_dir or default_cache_dir()
+    queries = QueryMemory(cache_dir / "queries.json")
+    client = SamfunnyClient(rate_limit=args.rate_limit, verbose=args.verbose,
+                            query_memory=queries) if args.engine == "sync" else None
+    cache = None if args.no_cache else ResultCache(cache_dir)
+    state = RunState(cache_dir / "state.json")
+    parse_cache = ParseCache(cache_dir / "parse_cache.json")
+
+    if not args.dry_run:
+        removed = cleanup_temp_files({m.parent for m in media_files})
+        if cache is not None:
+            removed += cache.store.cleanup_temp_files()
+        if removed:
+            print(f"Removed {removed} temp file(s) left by an interrupted run")
+
+    try:
+        _process_all(args, client, cache, state, parse_cache, queries, media_files)
+    finally:
+        # A dry run leaves everything on disk as it was
+        if not args.dry_run:
+            parse_cache.save()
+            queries.save()
+            if cache is not None:
+                cache.save()
+            state.save()
     return 0
 
 
+def _needs_subtitle(media: Path, state: RunState) -> bool:
+    # 跳过sample开头的视频文件
+    if media.name.lower().startswith('sample'):
+        print(f"\n>>> Skipping: {media.name} (sample file)")
+        return False
+
+    # 检查是否已经有字幕文件
+    ass_path = media.with_suffix('.ass')
+    srt_path = media.with_suffix('.srt')
+    existing = [p for p in (ass_path, srt_path) if p.exists()]
+    # 写入未完成（或为空）的字幕不算已存在，重新下载
+    if any(state.subtitle_complete(p) and p.stat().st_size > 0 for p in existing):
+        print(f"\n>>> Skipping: {media.name} (subtitle already exists)")
+        return False
+    if existing:
+        print(f"\n>>> Redoing: {media.name} (incomplete subtitle)")
+    return True
+
+
+def _process_all(args: argparse.Namespace, client: SamfunnyClient | None, cache: ResultCache | None, state: RunState,
+                 parse_cache: ParseCache, queries: QueryMemory, media_files: List[Path]):
+    pending = [m for m in media_files if _needs_subtitle(m, state)]
+    rows = index_library(pending, parse_cache, workers=args.index_workers)
+    infos = {m: row.media_info() for m, row in zip(pending, rows)}
+    queue = schedule(pending, state, lambda m: series_key(infos[m]))
+    budget = Budget(deadline=args.deadline, max_requests=args.max_requests)
+    # Subtitles are staged and committed (fsync + rename) a directory at a time; the
+    # partial markers are saved before each commit so a crash mid-commit finds them
+    writer = BatchWriter(on_stage=state.mark_partial, on_commit=state.mark_complete,
+                         before_commit=None if args.dry_run else state.save)
+
+    try:
+        if client is None:
+            deferred, reason = asyncio.run(_process_all_async(args, cache, state, queries, writer, queue, infos, budget))
+        else:
+            deferred, reason = [], None
+            for idx, media in enumerate(queue):
+                reason = budget.exhausted(client.request_count)
+                if reason:
+                    deferred = queue[idx:]
+                    break
+                info = infos[media]
+                ok = _process_one(args, client, cache, writer, media, info)
+                if ok is not None:
+                    state.record(media, series_key(info), ok)
+                writer.flush(due_only=True)
+    finally:
+        writer.flush()
+
+    if writer.failed:
+        print(f"\n{len(writer.failed)} subtitle(s) could not be written and will be redone next run:")
+        for p in writer.failed:
+            print(f"  - {p}")
+    if deferred:
+        print(f"\nStopping: {reason}; deferred {len(deferred)} file(s):")
+        for m in deferred:
+            print(f"  - {m}")
+    state.deferred = [str(m) for m in deferred]
+
+
+async def _process_all_async(args: argparse.Namespace, cache: ResultCache | None, state: RunState,
+                             queries: QueryMemory, writer: BatchWriter, queue: List[Path], infos: dict, budget: Budget):
+    from samfunny.aio_client import AsyncSamfunnyClient
+
+    slots = asyncio.Semaphore(max(args.concurrency, 1))
+    deferred: List[tuple] = []
+    reasons: List[str] = []
+
+    async with AsyncSamfunnyClient(rate_limit=args.rate_limit, verbose=args.verbose, query_memory=queries) as client:
+        async def run(idx: int, media: Path):
+            async with slots:
+                reason = budget.exhausted(client.request_count)
+                if reason:
+                    deferred.append((idx, media))
+                    reasons.append(reason)
+                    return
+                info = infos[media]
+                print(f"\n>>> Processing: {media.name}")
+                outcome = await process_media_async(
+                    client,
+                    media,
+                    info,
+                    cache=cache,
+                    prefer_format=args.prefer_format,
+                    max_pages=args.max_pages,
+                    accept_languages=args.accept_lang,
+                    dry_run=args.dry_run,
+                    verbose=args.verbose,
+                    writer=writer,
+                    log=lambda msg: print(f"[{media.name}] {msg}"),
+                )
+                if outcome.ok is not None:
+                    state.record(media, series_key(info), outcome.ok)
+                writer.flush(due_only=True)
+
+        await asyncio.gather(*(run(i, m) for i, m in enumerate(queue)))
+    return [m for _, m in sorted(deferred)], (reasons[0] if reasons else None)
+
+
+def _process_one(args: argparse.Namespace, client: SamfunnyClient, cache: ResultCache | None, writer: BatchWriter,
+                 media: Path, info: MediaInfo) -> bool | None:
+    """Find and place a subtitle for one file. Returns None when nothing was attempted (dry run)."""
+    print(f"\n>>> Processing: {media.name}")
+    outcome = process_media(
+        client,
+        media,
+        info,
+        cache=cache,
+        prefer_format=args.prefer_format,
+        max_pages=args.max_pages,
+        accept_languages=args.accept_lang,
+        dry_run=args.dry_run,
+        verbose=args.verbose,
+        writer=writer,
+    )
+    return outcome.ok
+
+
 if __name__ == "__main__":
     sys.exit(main())
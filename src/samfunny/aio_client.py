@@ -0,0 +1,230 @@
+from __future__ import annotations
+import asyncio
+import functools
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from bs4 import BeautifulSoup
+
+try:
+    import httpx
+except ImportError:  # optional: pip install zimu[async]
+    httpx = None
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    _HAS_H2 = True
+except ImportError:
+    _HAS_H2 = False
+
+from .client import (
+    BASE,
+    HEADERS,
+    extract_detail_urls,
+    list_page_url,
+    parse_detail_html,
+)
+from .cache import series_key
+from .downloader import place_content
+from .store import BatchWriter
+from .queries import FanoutSearch, QueryMemory, plan_queries
+from .types import Language, MediaInfo, SubtitleItem
+
+
+class AsyncRateLimiter:
+    """Minimum spacing between request starts, shared by all tasks on one loop."""
+
+    def __init__(self, interval: float):
+        self.interval = max(interval, 0.0)
+        self._lock = asyncio.Lock()
+        self._next = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AsyncSamfunnyClient:
+    """asyncio counterpart of SamfunnyClient built on httpx.
+
+    All requests share one ``httpx.AsyncClient``: HTTP/2 multiplexing when the ``h2``
+    package is installed (HTTPS only), otherwise a small pool of keep-alive connections.
+    HTML parsing runs in the default executor so the loop keeps serving other requests.
+    """
+
+    def __init__(self, rate_limit: float = 1.2, verbose: bool = False, base_url: str = BASE,
+                 max_connections: int = 4, query_memory: Optional[QueryMemory] = None):
+        if httpx is None:
+            raise RuntimeError("The async engine needs httpx: pip install 'httpx[http2]'")
+        self.base_url = base_url.rstrip("/")
+        self.verbose = verbose
+        self.http = httpx.AsyncClient(
+            headers=HEADERS,
+            http2=_HAS_H2,
+            timeout=20,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._limiter = AsyncRateLimiter(rate_limit)
+        self._warm: Optional[asyncio.Task] = None
+        self._searches: dict[str, FanoutSearch] = {}
+        self._series_locks: dict[str, asyncio.Lock] = {}
+        self._episode_locks: dict[str, asyncio.Lock] = {}
+        self.query_memory = query_memory
+        self.request_count = 0
+
+    async def __aenter__(self) -> "AsyncSamfunnyClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def _get(self, url: str, referer: str | None = None, timeout: float = 20) -> "httpx.Response":
+        await self._limiter.wait()
+        headers = {"Referer": referer} if referer else {}
+        if self.verbose:
+            print(f"GET {url}")
+        self.request_count += 1
+        resp = await self.http.get(url, headers=headers, timeout=timeout)
+        resp.raise_for_status()
+        return resp
+
+    @staticmethod
+    async def _offload(fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+
+    async def warmup(self):
+        """Visit homepage once per client; concurrent callers await the same visit."""
+        if self._warm is None:
+            self._warm = asyncio.ensure_future(self._warmup())
+        await self._warm
+
+    async def _warmup(self):
+        try:
+            r = await self._get(self.base_url)
+            if self.verbose:
+                print(f"Warmup homepage length={len(r.text)}")
+        except Exception as e:
+            if self.verbose:
+                print(f"Warmup failed: {e}")
+
+    async def search_list_page(self, query: str, page: int = 1) -> BeautifulSoup:
+        r = await self._get(list_page_url(self.base_url, query, page))
+        return await self._offload(BeautifulSoup, r.text, "lxml")
+
+    async def list_detail_urls(self, query: str, max_pages: int) -> List[str]:
+        """Detail URLs of up to ``max_pages`` list pages, stopping at the first empty page."""
+        urls: List[str] = []
+        for p in range(1, max_pages + 1):
+            soup = await self.search_list_page(query, p)
+            found, raw = extract_detail_urls(soup, self.base_url)
+            if self.verbose:
+                print(f"List page {p} for '{query}': extracted detail anchors={len(found)}, raw anchors total={raw}")
+            if not found:
+                break
+            urls.extend(found)
+        return urls
+
+    async def parse_detail(self, detail_url: str, search_query: str | None = None) -> List[SubtitleItem]:
+        referer = list_page_url(self.base_url, search_query) if search_query else None
+        r = await self._get(detail_url, referer=referer)
+        return await self._offload(parse_detail_html, r.text, detail_url, self.base_url, self.verbose)
+
+    def episode_lock(self, key: str) -> asyncio.Lock:
+        """Lock for one episode (a media key): sibling releases handled at the same time
+        take turns, so the later ones find the first one's download in the cache."""
+        return self._episode_locks.setdefault(key, asyncio.Lock())
+
+    async def search_and_collect(self, media: MediaInfo, max_pages: int) -> List[SubtitleItem]:
+        return list(await self.iter_search(media, max_pages))
+
+    async def iter_search(self, media: MediaInfo, max_pages: int) -> Iterator[SubtitleItem]:
+        """Same multi-query search as SamfunnyClient.iter_search.
+
+        Concurrent episodes of one series wait on a per-series lock and reuse its results;
+        the list pages of a wave and the queued detail pages are fetched concurrently.
+        """
+        key = series_key(media)
+        lock = self._series_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            search = self._searches.get(key)
+            if search is None:
+                remembered = self.query_memory.get(key) if self.query_memory else None
+                search = self._searches[key] = FanoutSearch(plan_queries(media), remembered)
+            failed_queries: List[str] = []
+            failed_details: List[tuple] = []
+            try:
+                while not search.satisfied(media):
+                    if search.queued:
+                        await self._fetch_queued(search, media, key, failed_details)
+                        continue
+                    wave = search.next_wave()
+                    if not wave:
+                        break
+                    await self.warmup()
+                    results = await asyncio.gather(*(self.list_detail_urls(q, max_pages) for q in wave),
+                                                   return_exceptions=True)
+                    errors = [r for r in results if isinstance(r, BaseException)]
+                    failed_queries.extend(q for q, r in zip(wave, results) if isinstance(r, BaseException))
+                    if len(errors) == len(results) and not len(search.index):
+                        raise errors[0]
+                    for query, urls in zip(wave, results):
+                        if not isinstance(urls, BaseException):
+                            search.enqueue(query, urls)
+            finally:
+                # Not retried within this call, but the next episode of the series tries again
+                search.retry(failed_queries, failed_details)
+            return search.index.iter_candidates(media)
+
+    async def _fetch_queued(self, search: FanoutSearch, media: MediaInfo, key: str, failed: List[tuple]):
+        """Fetch the queued detail pages of the next query; they go in together.
+
+        Pages that raised are appended to ``failed`` as (query, URL).
+        """
+        query = search.queued[0][0]
+        batch = []
+        while search.queued and search.queued[0][0] == query:
+            batch.append(search.queued.pop(0)[1])
+        pages = await asyncio.gather(*(self.parse_detail(u, search_query=query) for u in batch),
+                                     return_exceptions=True)
+        for url, items in zip(batch, pages):
+            if isinstance(items, BaseException):
+                if self.verbose:
+                    print(f"Detail parse failed {url}: {items}")
+                failed.append((query, url))
+                continue
+            search.add_items(items)
+        if search.satisfied(media) and self.query_memory:
+            self.query_memory.remember(key, query)
+
+    async def download_and_place(
+        self,
+        item: SubtitleItem,
+        video_path: Path,
+        prefer_format: str = "ass",
+        accept_languages: Optional[Iterable[Language]] = None,
+        media: Optional[MediaInfo] = None,
+        writer: Optional[BatchWriter] = None,
+    ) -> Path:
+        r = await self._get(item.download_url, referer=item.referer, timeout=60)
+        return await self._offload(
+            functools.partial(
+                place_content,
+                r.content,
+                r.headers.get("Content-Disposition", ""),
+                item,
+                video_path,
+                prefer_format=prefer_format,
+                accept_languages=accept_languages,
+                media=media,
+                writer=writer,
+            )
+        )
@@ -0,0 +1,186 @@
+from __future__ import annotations
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from .langcheck import detect_language
+from .store import BatchWriter, SubtitleStore
+from .types import Language, MediaInfo, SubFormat, SubtitleItem
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "zimu"
+
+
+def media_key(media: MediaInfo) -> str:
+    """Key for "the same episode/movie" regardless of release or file name."""
+    title = " ".join(media.title.lower().split())
+    return f"{title}|{media.year or ''}|{media.season if media.season is not None else ''}|{media.episode if media.episode is not None else ''}"
+
+
+def shared_media_key(media: MediaInfo) -> Optional[str]:
+    """``media_key`` when it names a single video (an episode, or a movie with a year),
+    so sibling releases may share a cache entry; None otherwise.
+
+    Anything vaguer (a date-based show, a yearless movie) could be many videos.
+    """
+    if media.episode is not None or (media.season is None and media.year is not None):
+        return media_key(media)
+    return None
+
+
+def series_key(media: MediaInfo) -> str:
+    """Key shared by every episode of a series (or a single movie)."""
+    title = " ".join(media.title.lower().split())
+    return f"{title}|{media.year or ''}"
+
+
+def item_to_dict(item: SubtitleItem) -> dict:
+    return {
+        "detail_url": item.detail_url,
+        "download_url": item.download_url,
+        "filename_text": item.filename_text,
+        "languages": [l.name for l in Language if l in item.languages],
+        "format": item.format.name,
+        "referer": item.referer,
+        "is_bilingual": item.is_bilingual,
+        "download_count": item.download_count,
+        "size_text": item.size_text,
+        "source_text": item.source_text,
+        "score_hint": item.score_hint,
+    }
+
+
+def item_from_dict(d: dict) -> SubtitleItem:
+    languages = Language(0)
+    for name in d.get("languages", []):
+        languages |= Language[name]
+    return SubtitleItem(
+        detail_url=d["detail_url"],
+        download_url=d["download_url"],
+        filename_text=d["filename_text"],
+        languages=languages,
+        format=SubFormat[d["format"]],
+        referer=d["referer"],
+        is_bilingual=d.get("is_bilingual", False),
+        download_count=d.get("download_count"),
+        size_text=d.get("size_text"),
+        source_text=d.get("source_text"),
+        score_hint=d.get("score_hint", 0),
+    )
+
+
+@dataclass
+class CacheEntry:
+    item: SubtitleItem
+    blob: str     # sha256 of the subtitle bytes in the SubtitleStore
+    suffix: str   # ".ass" or ".srt"
+
+
+class ResultCache:
+    """Remembers which subtitle was placed for a video, keyed by content fingerprint
+    and by parsed (title, year, season, episode); the bytes live in a SubtitleStore.
+    A parsed key that does not name a single video is never shared: such videos are
+    keyed by their fingerprint alone.
+
+    Each key keeps one entry per (detected language, format), newest first, so a run
+    only reuses a subtitle its ``accept_languages`` would have accepted, in its
+    preferred format when one was recorded.
+
+    Layout under ``root``::
+
+        index.json      {"fingerprints": {fp: media_key}, "media": {media_key: [entry, ...]}}
+        store/          content-addressed subtitle objects (see SubtitleStore)
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.store = SubtitleStore(root / "store")
+        self.index_path = root / "index.json"
+        self._fingerprints: dict[str, str] = {}
+        self._media: dict[str, List[dict]] = {}
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        self._fingerprints = data.get("fingerprints", {})
+        # Older caches kept a single entry per key
+        self._media = {k: v if isinstance(v, list) else [v] for k, v in data.get("media", {}).items()}
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_path.with_suffix(".json.tmp")
+            data = {"fingerprints": self._fingerprints, "media": self._media}
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.index_path)
+            self._dirty = False
+
+    def _language(self, raw: dict) -> Optional[Language]:
+        if "language" not in raw:
+            # Recorded before languages were kept: detect once from the stored bytes
+            detected = detect_language(self.store.read(raw["blob"]))
+            raw["language"] = detected.name if detected else None
+            self._dirty = True
+        return Language[raw["language"]] if raw["language"] else None
+
+    def lookup(self, fingerprint: str, media: MediaInfo, accept_languages: Optional[Iterable[Language]] = None,
+               prefer_format: Optional[str] = None) -> Optional[CacheEntry]:
+        """The entry to reuse for this video, or None.
+
+        Entries whose detected language is not in ``accept_languages`` are skipped, as
+        the language check of a fresh download would reject them.
+        """
+        accept = set(accept_languages) if accept_languages else None
+        with self._lock:
+            key = self._fingerprints.get(fingerprint) or shared_media_key(media)
+            usable = []
+            for raw in self._media.get(key, []) if key else []:
+                if not self.store.has(raw["blob"]):
+                    continue
+                language = self._language(raw) if accept else None
+                if language is None or accept is None or language in accept:
+                    usable.append(raw)
+            preferred = [raw for raw in usable if raw["suffix"] == f".{prefer_format}"]
+            raw = (preferred or usable or [None])[0]
+            if raw is None:
+                return None
+            if self._fingerprints.get(fingerprint) != key:
+                # Same episode seen under a different file (rename or sibling release)
+                self._fingerprints[fingerprint] = key
+                self._dirty = True
+            return CacheEntry(item=item_from_dict(raw["item"]), blob=raw["blob"], suffix=raw["suffix"])
+
+    def record(self, fingerprint: str, media: MediaInfo, item: SubtitleItem, subtitle_path: Path,
+               data: bytes | None = None):
+        """Remember ``item`` for this video; ``data`` is the subtitle if not yet at ``subtitle_path``."""
+        key = shared_media_key(media) or f"fp:{fingerprint}"
+        suffix = subtitle_path.suffix.lower()
+        if data is None:
+            data = subtitle_path.read_bytes()
+        digest = self.store.put(data)
+        detected = detect_language(data)
+        entry = {"item": item_to_dict(item), "blob": digest, "suffix": suffix,
+                 "language": detected.name if detected else None}
+        with self._lock:
+            others = [e for e in self._media.get(key, [])
+                      if (e["suffix"], e.get("language", entry["language"])) != (suffix, entry["language"])]
+            self._media[key] = [entry] + others
+            self._fingerprints[fingerprint] = key
+            self._dirty = True
+
+    def place(self, entry: CacheEntry, video_path: Path, writer: BatchWriter | None = None) -> Path:
+        out_path = video_path.with_suffix(entry.suffix)
+        self.store.place(entry.blob, out_path, writer)
+        return out_path
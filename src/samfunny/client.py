@@ -1,12 +1,18 @@
 from __future__ import annotations
+import threading
 import time
-from typing import Iterable, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
 import re
 
 import requests
 from bs4 import BeautifulSoup
 
 from .types import SubtitleItem, Language, SubFormat, MediaInfo
+from .cache import series_key
+from .queries import FanoutSearch, QueryMemory, plan_queries
+# Re-exported: these lived here before the query planner
+from .queries import normalize_query, optimized_query  # noqa: F401
 
 BASE = "https://www.samfunny.com"
 HEADERS = {
@@ -54,39 +60,192 @@ def _detect_format(text: str) -> SubFormat:
     return SubFormat.OTHER
 
 
-def _detect_languages(container: BeautifulSoup) -> list[Language]:
-    langs: list[Language] = []
+def _detect_languages(container: BeautifulSoup) -> Language:
+    langs = Language(0)
     for img in container.find_all("img"):
         src = img.get("src", "")
         if "jollyroger" in src:
-            langs.append(Language.BILINGUAL)
+            langs |= Language.BILINGUAL
         elif "china" in src:
-            langs.append(Language.SIMPLIFIED)
+            langs |= Language.SIMPLIFIED
         elif "uk" in src:
-            langs.append(Language.ENGLISH)
+            langs |= Language.ENGLISH
         elif "hongkong" in src:
-            langs.append(Language.TRADITIONAL)
+            langs |= Language.TRADITIONAL
     # Textual hints
     text = container.get_text(" ", strip=True)
     if any(k in text for k in ["双语", "中英双语", "简英双语", "chs&eng", "chs_eng"]):
-        if Language.BILINGUAL not in langs:
-            langs.append(Language.BILINGUAL)
+        langs |= Language.BILINGUAL
     return langs
 
 
+def list_page_url(base_url: str, query: str, page: int = 1) -> str:
+    url = f"{base_url}/download/xslist.php?key={requests.utils.quote(query)}"
+    if page > 1:
+        url += f"&p={page}"
+    return url
+
+
+def extract_detail_urls(soup: BeautifulSoup, base_url: str = BASE) -> tuple[List[str], int]:
+    """Detail page URLs on a search list page, plus the raw /download/ anchor count."""
+    anchors = soup.select('a[href*="/download/"]')
+    urls: List[str] = []
+    for a in anchors:
+        href = a.get("href", "")
+        if not href:
+            continue
+        # Normalize relative
+        full = requests.compat.urljoin(base_url, href)
+        # Accept both .html and numeric endpoints
+        if "/download/" in href and (href.endswith(".html") or re.search(r"/download/\d+", href)):
+            urls.append(full if full.endswith('.html') else full + '.html')
+    return urls, len(anchors)
+
+
+def parse_detail_html(html: str, detail_url: str, base_url: str = BASE, verbose: bool = False) -> List[SubtitleItem]:
+    """Subtitle rows from the "字幕文件下载" section of a detail page."""
+    soup = BeautifulSoup(html, "lxml")
+    items: List[SubtitleItem] = []
+
+    # Quick truncated-page detection: if essential marker absent, return empty
+    if "字幕文件下载" not in html and len(html) < 2000:
+        if verbose:
+            print("Truncated or anti-bot page received; no subtitle section present.")
+        return items
+
+    # Prefer to bound search by the download section if present
+    section = None
+    for h3 in soup.find_all(["h2", "h3"]):
+        if "字幕文件下载" in h3.get_text(strip=True):
+            section = h3
+            break
+    # Find the list container which contains the download links
+    container = None
+    if section:
+        # Look for the sibling div with class "list" which contains download links
+        for sibling in section.find_next_siblings():
+            if sibling.name == "div" and "list" in sibling.get("class", []):
+                container = sibling
+                break
+    if not container:
+        container = soup
+
+    # Get all download-related links, not just .sub ones
+    all_download_links = container.select('a[href*="/download/"]')
+    if verbose:
+        print(f"Detail {detail_url} found {len(all_download_links)} /download/ anchors")
+        # Show some examples for debugging
+        for a in all_download_links[:5]:
+            print(" - href:", a.get('href'), "text=", a.get_text(strip=True)[:80])
+    
+    # Process each download link individually
+    processed_hrefs = set()
+    for a in all_download_links:
+        href = a.get("href", "").strip()
+        if not href or href in processed_hrefs:
+            continue
+        processed_hrefs.add(href)
+        
+        # Skip .html links (probably detail pages, not direct downloads)
+        if href.endswith('.html'):
+            continue
+            
+        download_url = requests.compat.urljoin(base_url, href)
+        filename_text = a.get_text(strip=True) or href.rsplit("/", 1)[-1]
+        
+        # Get the row container - should be li or parent div
+        li = a.find_parent("li")
+        row = li if li is not None else (a.parent if a.parent else container)
+        
+        # Extract languages
+        langs = _detect_languages(row)
+        
+        # Extract format from text
+        row_text = row.get_text(" ", strip=True)
+        fmt = _detect_format(row_text)
+        
+        # Extract download count
+        dl_count = None
+        dl_div = row.select_one(".shu span") if row else None
+        if dl_div:
+            try:
+                dl_count = int(dl_div.get_text(strip=True))
+            except ValueError:
+                dl_count = None
+        
+        # Extract other metadata
+        size_text = None
+        size_div = row.select_one(".size") if row else None
+        if size_div:
+            size_text = size_div.get_text(strip=True)
+        
+        source_text = None
+        source_span = row.select_one(".zimuzu span") if row else None
+        if source_span:
+            source_text = source_span.get_text(strip=True)
+        
+        is_bilingual = Language.BILINGUAL in langs or ("&eng" in row_text.lower()) or ("双语" in row_text)
+        
+        # Skip unsupported file types
+        if href.lower().endswith('.rar'):
+            if verbose:
+                print(f"Skip .rar archive: {filename_text}")
+            continue
+        
+        # Don't filter by filename extension since some direct downloads might not have proper extensions
+        # Instead, let the downloader handle content detection
+        items.append(
+            SubtitleItem(
+                detail_url=detail_url,
+                download_url=download_url,
+                filename_text=filename_text,
+                languages=langs,
+                format=fmt,
+                referer=detail_url,
+                is_bilingual=is_bilingual,
+                download_count=dl_count,
+                size_text=size_text,
+                source_text=source_text,
+            )
+        )
+    return items
+
+
 class SamfunnyClient:
-    def __init__(self, rate_limit: float = 1.2, verbose: bool = False):
+    def __init__(self, rate_limit: float = 1.2, verbose: bool = False, base_url: str = BASE,
+                 query_memory: Optional[QueryMemory] = None, search_ttl: Optional[float] = None):
         self.session = requests.Session()
         self.session.headers.update(HEADERS)
+        self.base_url = base_url.rstrip("/")
         self.rate_limit = max(rate_limit, 0.0)
         self.verbose = verbose
         self._last_request_ts = 0.0
+        # Shared by all threads using this client (e.g. the local service)
+        self._rate_lock = threading.Lock()
+        self._warm = False
+        # Series searches already done by this client, so every episode of a series reuses one;
+        # a long-lived client (the local service) drops them after search_ttl seconds
+        self._searches: dict[str, FanoutSearch] = {}
+        self._series_locks: dict[str, threading.Lock] = {}
+        self._searches_lock = threading.Lock()
+        self.search_ttl = search_ttl
+        # Winning query variant per series, persisted by the caller
+        self.query_memory = query_memory
+        # Counts every request made through the session, downloads included
+        self.request_count = 0
+        self.session.hooks["response"].append(self._count_request)
+
+    def _count_request(self, resp: requests.Response, *args, **kwargs):
+        self.request_count += 1
 
     def _sleep_if_needed(self):
-        now = time.time()
-        delta = now - self._last_request_ts
-        if delta < self.rate_limit:
-            time.sleep(self.rate_limit - delta)
+        # Reserve the next request slot under the lock so concurrent callers queue up
+        with self._rate_lock:
+            now = time.time()
+            wait = self._last_request_ts + self.rate_limit - now
+            self._last_request_ts = max(now, self._last_request_ts + self.rate_limit)
+        if wait > 0:
+            time.sleep(wait)
 
     def _get(self, url: str, referer: str | None = None) -> requests.Response:
         self._sleep_if_needed()
@@ -98,14 +257,18 @@ class SamfunnyClient:
         resp = self.session.get(url, headers=headers, timeout=20)
         if self.verbose:
             print(f"Request headers: {resp.request.headers}")
-        self._last_request_ts = time.time()
+        with self._rate_lock:
+            self._last_request_ts = max(self._last_request_ts, time.time())
         resp.raise_for_status()
         return resp
 
     def warmup(self):
-        """Visit homepage to establish any cookies or session before search."""
+        """Visit homepage once per client to establish any cookies or session before search."""
+        if self._warm:
+            return
+        self._warm = True
         try:
-            r = self._get(BASE)
+            r = self._get(self.base_url)
             if self.verbose:
                 print(f"Warmup homepage length={len(r.text)}")
         except Exception as e:
@@ -113,179 +276,128 @@ class SamfunnyClient:
                 print(f"Warmup failed: {e}")
 
     def search_list_page(self, query: str, page: int = 1) -> BeautifulSoup:
-        url = f"{BASE}/download/xslist.php?key={requests.utils.quote(query)}"
-        if page > 1:
-            url += f"&p={page}"
-        r = self._get(url)
+        r = self._get(list_page_url(self.base_url, query, page))
         return BeautifulSoup(r.text, "lxml")
 
-    def iter_detail_urls(self, query: str, max_pages: int) -> Iterable[str]:
-        for p in range(1, max_pages + 1):
-            soup = self.search_list_page(query, page=p)
-            anchors = soup.select('a[href*="/download/"]')
-            count = 0
-            for a in anchors:
-                href = a.get("href", "")
-                if not href:
-                    continue
-                # Normalize relative
-                full = requests.compat.urljoin(BASE, href)
-                # Accept both .html and numeric endpoints
-                if "/download/" in href and (href.endswith(".html") or re.search(r"/download/\d+", href)):
-                    count += 1
-                    yield full if full.endswith('.html') else (full if full.endswith('.html') else full + ('' if full.endswith('.html') else '.html'))
-            if self.verbose:
-                print(f"List page {p}: extracted detail anchors={count}, raw anchors total={len(anchors)}")
-
     def parse_detail(self, detail_url: str, search_query: str | None = None) -> List[SubtitleItem]:
         referer = None
         if search_query:
-            referer = f"{BASE}/download/xslist.php?key={requests.utils.quote(search_query)}"
+            referer = list_page_url(self.base_url, search_query)
         r = self._get(detail_url, referer=referer)
         if self.verbose:
             print(f"Detail page length: {len(r.text)}")
             print(f"Contains '字幕文件下载': {'字幕文件下载' in r.text}")
-        soup = BeautifulSoup(r.text, "lxml")
-        items: List[SubtitleItem] = []
+        return parse_detail_html(r.text, detail_url, self.base_url, self.verbose)
 
-        # Quick truncated-page detection: if essential marker absent, return empty
-        if "字幕文件下载" not in r.text and len(r.text) < 2000:
+    def list_detail_urls(self, query: str, max_pages: int) -> List[str]:
+        """Detail URLs of up to ``max_pages`` list pages, stopping at the first empty page."""
+        urls: List[str] = []
+        for p in range(1, max_pages + 1):
+            soup = self.search_list_page(query, page=p)
+            found, raw = extract_detail_urls(soup, self.base_url)
             if self.verbose:
-                print("Truncated or anti-bot page received; no subtitle section present.")
-            return items
-
-        # Prefer to bound search by the download section if present
-        section = None
-        for h3 in soup.find_all(["h2", "h3"]):
-            if "字幕文件下载" in h3.get_text(strip=True):
-                section = h3
+                print(f"List page {p} for '{query}': extracted detail anchors={len(found)}, raw anchors total={raw}")
+            if not found:
                 break
-        # Find the list container which contains the download links
-        container = None
-        if section:
-            # Look for the sibling div with class "list" which contains download links
-            for sibling in section.find_next_siblings():
-                if sibling.name == "div" and "list" in sibling.get("class", []):
-                    container = sibling
-                    break
-        if not container:
-            container = soup
-
-        # Get all download-related links, not just .sub ones
-        all_download_links = container.select('a[href*="/download/"]')
-        if self.verbose:
-            print(f"Detail {detail_url} found {len(all_download_links)} /download/ anchors")
-            # Show some examples for debugging
-            for a in all_download_links[:5]:
-                print(" - href:", a.get('href'), "text=", a.get_text(strip=True)[:80])
-        
-        # Process each download link individually
-        processed_hrefs = set()
-        for a in all_download_links:
-            href = a.get("href", "").strip()
-            if not href or href in processed_hrefs:
-                continue
-            processed_hrefs.add(href)
-            
-            # Skip .html links (probably detail pages, not direct downloads)
-            if href.endswith('.html'):
-                continue
-                
-            download_url = requests.compat.urljoin(BASE, href)
-            filename_text = a.get_text(strip=True) or href.rsplit("/", 1)[-1]
-            
-            # Get the row container - should be li or parent div
-            li = a.find_parent("li")
-            row = li if li is not None else (a.parent if a.parent else container)
-            
-            # Extract languages
-            langs = _detect_languages(row)
-            
-            # Extract format from text
-            row_text = row.get_text(" ", strip=True)
-            fmt = _detect_format(row_text)
-            
-            # Extract download count
-            dl_count = None
-            dl_div = row.select_one(".shu span") if row else None
-            if dl_div:
-                try:
-                    dl_count = int(dl_div.get_text(strip=True))
-                except ValueError:
-                    dl_count = None
-            
-            # Extract other metadata
-            size_text = None
-            size_div = row.select_one(".size") if row else None
-            if size_div:
-                size_text = size_div.get_text(strip=True)
-            
-            source_text = None
-            source_span = row.select_one(".zimuzu span") if row else None
-            if source_span:
-                source_text = source_span.get_text(strip=True)
-            
-            is_bilingual = Language.BILINGUAL in langs or ("&eng" in row_text.lower()) or ("双语" in row_text)
-            
-            # Skip unsupported file types
-            if href.lower().endswith('.rar'):
-                if self.verbose:
-                    print(f"Skip .rar archive: {filename_text}")
-                continue
-            
-            # Don't filter by filename extension since some direct downloads might not have proper extensions
-            # Instead, let the downloader handle content detection
-            items.append(
-                SubtitleItem(
-                    detail_url=detail_url,
-                    download_url=download_url,
-                    filename_text=filename_text,
-                    languages=langs,
-                    format=fmt,
-                    referer=detail_url,
-                    is_bilingual=is_bilingual,
-                    download_count=dl_count,
-                    size_text=size_text,
-                    source_text=source_text,
-                )
-            )
-        return items
+            urls.extend(found)
+        return urls
 
-    def search_and_collect(self, media: MediaInfo, max_pages: int) -> List[SubtitleItem]:
-        # Optimize query: use only Chinese part for better search results
-        query = media.title
-        # If title contains multiple languages (has both Chinese and non-Chinese characters), 
-        # extract only the Chinese part for search
-        chinese_part = ''.join([c for c in query if '\u4e00' <= c <= '\u9fff']).strip()
-        if chinese_part and len(chinese_part) < len(query):
-            if self.verbose:
-                print(f"Optimized search query: '{query}' -> '{chinese_part}'")
-            query = chinese_part
-        # Warmup once per overall search
-        self.warmup()
-        # If episode available, some站不支持精确集数检索，先仅用剧名
-        collected: List[SubtitleItem] = []
-        seen_urls = set()
-        
-        for detail_url in self.iter_detail_urls(query, max_pages=max_pages):
+    def _series_search(self, media: MediaInfo, key: str) -> tuple[threading.Lock, FanoutSearch]:
+        with self._searches_lock:
+            if self.search_ttl is not None:
+                self._evict_expired_searches()
+            lock = self._series_locks.setdefault(key, threading.Lock())
+        with lock:
+            search = self._searches.get(key)
+            if search is None or (self.search_ttl is not None and time.monotonic() - search.created > self.search_ttl):
+                remembered = self.query_memory.get(key) if self.query_memory else None
+                search = self._searches[key] = FanoutSearch(plan_queries(media), remembered)
+        return lock, search
+
+    def _evict_expired_searches(self):
+        # Called with _searches_lock held. The per-series locks stay: one may be held by a
+        # thread about to store a fresh search, and a lock is far smaller than an index.
+        now = time.monotonic()
+        for key, search in list(self._searches.items()):
+            if now - search.created > self.search_ttl:
+                del self._searches[key]
+
+    def _fetch_wave(self, search: FanoutSearch, wave: List[str], max_pages: int, failed: List[str]):
+        """List pages of every query in ``wave`` at once; the rate limiter still spaces them.
+
+        Queries whose search raised are appended to ``failed``.
+        """
+        if len(wave) == 1:
+            results = [self._try(self.list_detail_urls, wave[0], max_pages)]
+        else:
+            with ThreadPoolExecutor(max_workers=len(wave)) as pool:
+                results = list(pool.map(lambda q: self._try(self.list_detail_urls, q, max_pages), wave))
+        errors = [r for r in results if isinstance(r, Exception)]
+        failed.extend(q for q, r in zip(wave, results) if isinstance(r, Exception))
+        if len(errors) == len(results) and not len(search.index) and not search.queued:
+            raise errors[0]
+        for query, urls in zip(wave, results):
+            if not isinstance(urls, Exception):
+                search.enqueue(query, urls)
+            elif self.verbose:
+                print(f"Search for '{query}' failed: {urls}")
+
+    def _fetch_queued(self, search: FanoutSearch, media: MediaInfo, key: str, failed: List[tuple]):
+        """Fetch every queued detail page of the next query before checking for hits,
+        so a variant contributes its whole candidate pool (as in the async engine).
+
+        Pages that raised are appended to ``failed`` as (query, URL).
+        """
+        query = search.queued[0][0]
+        while search.queued and search.queued[0][0] == query:
+            detail_url = search.queued.pop(0)[1]
             try:
-                items = self.parse_detail(detail_url, search_query=query)
+                search.add_items(self.parse_detail(detail_url, search_query=query))
             except Exception as e:
                 if self.verbose:
                     print(f"Detail parse failed {detail_url}: {e}")
-                continue
-            
-            # Filter out duplicate subtitles and add to collection
-            for item in items:
-                if item.download_url not in seen_urls:
-                    seen_urls.add(item.download_url)
-                    collected.append(item)
-            
-            # For TV, prefer items mentioning SxxExx if present
-            if media.episode_str:
-                ep = media.episode_str
-                collected = [it for it in collected if not ep or ep in (it.filename_text or "")]
-            
+                failed.append((query, detail_url))
+        if search.satisfied(media) and self.query_memory:
+            self.query_memory.remember(key, query)
+
+    @staticmethod
+    def _try(fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            return e
+
+    def search_and_collect(self, media: MediaInfo, max_pages: int) -> List[SubtitleItem]:
+        return list(self.iter_search(media, max_pages))
+
+    def iter_search(self, media: MediaInfo, max_pages: int) -> Iterator[SubtitleItem]:
+        """Candidates for ``media`` from a multi-query search shared by its whole series.
+
+        The remembered (or most likely) query goes first; the other variants from
+        ``plan_queries`` are only searched when it yields no strong hits for this episode.
+        The search runs (and raises) on the call; the items are streamed from the series
+        index without building a list.
+        """
+        key = series_key(media)
+        lock, search = self._series_search(media, key)
+        with lock:
+            failed_queries: List[str] = []
+            failed_details: List[tuple] = []
+            try:
+                while not search.satisfied(media):
+                    if search.queued:
+                        self._fetch_queued(search, media, key, failed_details)
+                        continue
+                    wave = search.next_wave()
+                    if not wave:
+                        break
+                    if self.verbose:
+                        print(f"Searching {wave}")
+                    self.warmup()
+                    self._fetch_wave(search, wave, max_pages, failed_queries)
+            finally:
+                # Not retried within this call, but the next episode of the series tries again
+                search.retry(failed_queries, failed_details)
             if self.verbose:
-                print(f"Collected unique items total={len(collected)} after {detail_url}")
-        return collected
+                print(f"{len(search.index)} items collected for '{media.title}'")
+            return search.index.iter_candidates(media)
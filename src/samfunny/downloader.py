@@ -4,34 +4,49 @@ import os
 import re
 import zipfile
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
 import requests
 
-from .types import SubtitleItem
+from .langcheck import LanguageMismatch, verify_language
+from .store import BatchWriter, write_if_changed
+from .episodes import parse_coverage
+from .types import Language, MediaInfo, SubtitleItem
 
 
-def _pick_from_zip(zf: zipfile.ZipFile, prefer_format: str) -> Optional[tuple[str, bytes]]:
+def _pick_from_zip(zf: zipfile.ZipFile, prefer_format: str, media: Optional[MediaInfo] = None,
+                   accept_languages: Optional[Iterable[Language]] = None) -> Optional[tuple[str, bytes]]:
+    """The subtitle to use from an archive, preferred format first.
+
+    With ``accept_languages`` every candidate is checked in turn (archives often hold a
+    big5 and a gb version side by side); LanguageMismatch is raised only if none pass.
+    """
     names = zf.namelist()
     # Filter to subtitle files
     cands = [n for n in names if n.lower().endswith((".ass", ".srt"))]
     if not cands:
         return None
-    # Preferred format first
-    if prefer_format == "ass":
-        for n in cands:
-            if n.lower().endswith(".ass"):
-                with zf.open(n) as fh:
-                    return n, fh.read()
-    if prefer_format == "srt":
-        for n in cands:
-            if n.lower().endswith(".srt"):
-                with zf.open(n) as fh:
-                    return n, fh.read()
-    # else first available
-    n = cands[0]
-    with zf.open(n) as fh:
-        return n, fh.read()
+    # Season packs / ranges: keep only the files for this episode when any are labelled
+    if media is not None and media.episode is not None:
+        matching = [n for n in cands if parse_coverage(n.rsplit("/", 1)[-1]).covers(media.season, media.episode)]
+        if matching:
+            cands = matching
+    # Preferred format first, then the rest in archive order
+    preferred = [n for n in cands if n.lower().endswith(f".{prefer_format}")]
+    cands = preferred + [n for n in cands if n not in preferred]
+    accept = list(accept_languages) if accept_languages else None
+    mismatch = None
+    for n in cands:
+        with zf.open(n) as fh:
+            data = fh.read()
+        if accept:
+            try:
+                verify_language(data, accept)
+            except LanguageMismatch as e:
+                mismatch = e
+                continue
+        return n, data
+    raise mismatch
 
 
 def _final_sub_path(video_path: Path, picked_name: str) -> Path:
@@ -39,15 +54,59 @@ def _final_sub_path(video_path: Path, picked_name: str) -> Path:
     return video_path.with_suffix(ext)
 
 
-def download_and_place(session: requests.Session, item: SubtitleItem, video_path: Path, prefer_format: str = "ass") -> Path:
+def download_and_place(
+    session: requests.Session,
+    item: SubtitleItem,
+    video_path: Path,
+    prefer_format: str = "ass",
+    accept_languages: Optional[Iterable[Language]] = None,
+    media: Optional[MediaInfo] = None,
+    writer: Optional[BatchWriter] = None,
+) -> Path:
+    """Download ``item`` and place it next to ``video_path``.
+
+    With ``accept_languages``, the subtitle text is checked before anything is written
+    and LanguageMismatch is raised if its detected language tier is not accepted.
+    With ``media``, archives holding several episodes yield the file for that episode.
+    The file is written atomically; with ``writer`` it appears when that batch commits.
+    """
     # Download with referer header
     headers = {"Referer": item.referer}
     r = session.get(item.download_url, headers=headers, timeout=60, allow_redirects=True)
     r.raise_for_status()
-    
+    return place_content(
+        r.content,
+        r.headers.get("Content-Disposition", ""),
+        item,
+        video_path,
+        prefer_format=prefer_format,
+        accept_languages=accept_languages,
+        media=media,
+        writer=writer,
+    )
+
+
+def place_content(
+    content: bytes,
+    cd: str,
+    item: SubtitleItem,
+    video_path: Path,
+    prefer_format: str = "ass",
+    accept_languages: Optional[Iterable[Language]] = None,
+    media: Optional[MediaInfo] = None,
+    writer: Optional[BatchWriter] = None,
+) -> Path:
+    """Validate downloaded bytes (``cd`` is the Content-Disposition header) and place them.
+
+    Shared by the requests-based and asyncio-based download paths.
+    """
+    def _place(out_path: Path, data: bytes) -> Path:
+        if accept_languages:
+            verify_language(data, accept_languages)
+        write_if_changed(out_path, data, writer)
+        return out_path
+
     # Check if the response is likely an error page, anti-scraping response, or 'file not found' message
-    content = r.content
-    
     # Check for common Chinese error messages
     try:
         content_str = content.decode('utf-8', errors='replace')
@@ -66,7 +125,6 @@ def download_and_place(session: requests.Session, item: SubtitleItem, video_path
                 raise RuntimeError(f"Download returned error/anti-scraping response instead of subtitle file (got {len(content)} bytes). URL: {item.download_url}")
 
     # Infer filename and content
-    cd = r.headers.get("Content-Disposition", "")
     raw_name = item.filename_text
     
     # Improved Content-Disposition parsing with fallback logic
@@ -78,18 +136,17 @@ def download_and_place(session: requests.Session, item: SubtitleItem, video_path
         # Handle URL-encoded characters
         raw_name = requests.utils.unquote(raw_name)
 
-    content = r.content
-    
     # Zip handling first - always check by magic bytes for reliability
     out_path: Path
     if len(content) >= 4 and content[:2] == b'PK':
         with zipfile.ZipFile(io.BytesIO(content)) as zf:
-            picked = _pick_from_zip(zf, prefer_format)
+            picked = _pick_from_zip(zf, prefer_format, media, accept_languages)
             if not picked:
                 raise RuntimeError("ZIP file contains no .srt/.ass")
             picked_name, picked_bytes = picked
+            # Already language-checked while picking
             out_path = _final_sub_path(video_path, picked_name)
-            out_path.write_bytes(picked_bytes)
+            write_if_changed(out_path, picked_bytes, writer)
             return out_path
 
     # Process content with BOM stripping and improved detection
@@ -138,12 +195,10 @@ def download_and_place(session: requests.Session, item: SubtitleItem, video_path
     # Save the file based on detected content type
     if is_ass:
         out_path = video_path.with_suffix('.ass')
-        out_path.write_bytes(content)
-        return out_path
+        return _place(out_path, content)
     elif is_srt:
         out_path = video_path.with_suffix('.srt')
-        out_path.write_bytes(content)
-        return out_path
+        return _place(out_path, content)
 
     # If we got here, it's an unsupported file type
     # Try to detect what type it might be for better error reporting
@@ -175,13 +230,11 @@ def download_and_place(session: requests.Session, item: SubtitleItem, video_path
             if has_timecodes:
                 # Has timecodes - likely a subtitle file, try to save as SRT
                 out_path = video_path.with_suffix('.srt')
-                out_path.write_bytes(content)
-                return out_path
+                return _place(out_path, content)
             elif has_numbers and newline_count > 50:
                 # Has numbers at start of lines and many lines - likely SRT
                 out_path = video_path.with_suffix('.srt')
-                out_path.write_bytes(content)
-                return out_path
+                return _place(out_path, content)
             
             detected_type = f"Text file (has {newline_count} lines, timecodes: {has_timecodes}, numbers: {has_numbers})"
         elif all(c.isprintable() or c in '\n\t\r' for c in content_str[:1000]):
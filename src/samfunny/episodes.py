@@ -0,0 +1,168 @@
+from __future__ import annotations
+import re
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .types import MediaInfo, SubtitleItem
+
+EPISODE = "episode"
+RANGE = "range"
+SEASON = "season"
+UNKNOWN = "unknown"
+
+# Ranges wider than this are treated as season packs rather than expanded
+_MAX_RANGE = 100
+
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+# The end number must not run into a resolution: "S01E05-480p" is episode 5, not 5-480
+_SXXEXX_RANGE_RE = re.compile(r"S(\d{1,2})[ ._-]?E(\d{1,3})(?:[ ._]*(?:-|~|to)[ ._]*(?:S\d{1,2})?E?|E)(\d{1,3})(?![\dp])", re.I)
+_SXXEXX_RE = re.compile(r"S(\d{1,2})[ ._-]?E(\d{1,3})(?!\d)", re.I)
+_CN_RANGE_RE = re.compile(r"第\s*(\d{1,3})\s*[-~至到]\s*(\d{1,3})\s*集")
+_CN_EP_RE = re.compile(r"第\s*(\d{1,3})\s*集")
+_EP_RE = re.compile(r"(?<![A-Za-z0-9])EP?(\d{1,3})(?!\d)", re.I)
+_SEASON_RE = re.compile(r"(?<![A-Za-z0-9])S(\d{1,2})(?![0-9E])|Season[ ._]?(\d{1,2})(?!\d)", re.I)
+_CN_SEASON_RE = re.compile(r"第\s*([0-9零一二两三四五六七八九十]{1,3})\s*季")
+_PACK_RE = re.compile(r"全集|全\d+集|complete", re.I)
+
+
+class Coverage(NamedTuple):
+    kind: str                      # EPISODE, RANGE, SEASON or UNKNOWN
+    season: Optional[int] = None   # None when the label has no season
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+    def covers(self, season: Optional[int], episode: Optional[int]) -> bool:
+        if self.kind == UNKNOWN:
+            return False
+        if self.season is not None and season is not None and self.season != season:
+            return False
+        if self.kind == SEASON:
+            return True
+        return episode is not None and self.start <= episode <= self.end
+
+
+def _cn_number(text: str) -> Optional[int]:
+    if text.isdigit():
+        return int(text)
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        return (_CN_DIGITS.get(tens, 1) if tens else 1) * 10 + (_CN_DIGITS.get(ones, 0) if ones else 0)
+    if len(text) == 1 and text in _CN_DIGITS:
+        return _CN_DIGITS[text]
+    return None
+
+
+def _season_of(text: str) -> Optional[int]:
+    m = _CN_SEASON_RE.search(text)
+    if m:
+        return _cn_number(m.group(1))
+    m = _SEASON_RE.search(text)
+    if m:
+        return int(m.group(1) or m.group(2))
+    return None
+
+
+def parse_coverage(text: str) -> Coverage:
+    """Which episodes a subtitle label covers: ``S01E05``, ``S01E01-E03``, ``E05``,
+    ``第05集``, ``第1-3集``, season packs (``S01``, ``第一季 全集``) or unknown."""
+    if not text:
+        return Coverage(UNKNOWN)
+    m = _SXXEXX_RANGE_RE.search(text)
+    if m:
+        season, start, end = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        if start < end:
+            if end - start > _MAX_RANGE:
+                return Coverage(SEASON, season)
+            return Coverage(RANGE, season, start, end)
+    m = _SXXEXX_RE.search(text)
+    if m:
+        ep = int(m.group(2))
+        return Coverage(EPISODE, int(m.group(1)), ep, ep)
+    season = _season_of(text)
+    m = _CN_RANGE_RE.search(text)
+    if m and int(m.group(1)) < int(m.group(2)) <= int(m.group(1)) + _MAX_RANGE:
+        return Coverage(RANGE, season, int(m.group(1)), int(m.group(2)))
+    m = _CN_EP_RE.search(text) or _EP_RE.search(text)
+    if m:
+        ep = int(m.group(1))
+        return Coverage(EPISODE, season, ep, ep)
+    if season is not None or _PACK_RE.search(text):
+        return Coverage(SEASON, season)
+    return Coverage(UNKNOWN)
+
+
+class EpisodeIndex:
+    """Subtitle items of one title search, bucketed by the episodes they cover.
+
+    Each item's label is parsed once on ``add``; ``candidates`` is then a few dict
+    lookups for any episode, so one index serves every episode of a series.
+    """
+
+    def __init__(self, items: List[SubtitleItem] | None = None):
+        self.items: List[SubtitleItem] = []
+        self._episodes: Dict[Tuple[Optional[int], int], List[SubtitleItem]] = {}
+        self._ranges: Dict[Tuple[Optional[int], int], List[SubtitleItem]] = {}
+        # Same buckets keyed by episode alone, for files whose name carries no season
+        self._episodes_any: Dict[int, List[SubtitleItem]] = {}
+        self._ranges_any: Dict[int, List[SubtitleItem]] = {}
+        self._seasons: Dict[Optional[int], List[SubtitleItem]] = {}
+        self._unknown: List[SubtitleItem] = []
+        for item in items or ():
+            self.add(item)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, item: SubtitleItem) -> Coverage:
+        cov = parse_coverage(item.filename_text)
+        self.items.append(item)
+        if cov.kind == EPISODE:
+            self._episodes.setdefault((cov.season, cov.start), []).append(item)
+            self._episodes_any.setdefault(cov.start, []).append(item)
+        elif cov.kind == RANGE:
+            for ep in range(cov.start, cov.end + 1):
+                self._ranges.setdefault((cov.season, ep), []).append(item)
+                self._ranges_any.setdefault(ep, []).append(item)
+        elif cov.kind == SEASON:
+            self._seasons.setdefault(cov.season, []).append(item)
+        else:
+            self._unknown.append(item)
+        return cov
+
+    def candidates(self, media: MediaInfo) -> List[SubtitleItem]:
+        """Items for ``media``'s episode: exact episode, then ranges, then season packs.
+
+        Labels without a season match any season, and so does a file name without one.
+        Movies (no episode) get every item.
+        """
+        return list(self.iter_candidates(media))
+
+    def iter_candidates(self, media: MediaInfo) -> Iterator[SubtitleItem]:
+        """Same order as ``candidates``, streamed straight from the buckets."""
+        if media.episode is None:
+            yield from self.items
+            return
+        yield from self.exact_candidates(media)
+        if media.season is None:
+            packs = list(self._seasons.values())
+        else:
+            packs = [self._seasons.get(media.season), self._seasons.get(None)]
+        for bucket in packs:
+            if bucket:
+                yield from bucket
+
+    def exact_candidates(self, media: MediaInfo) -> List[SubtitleItem]:
+        """Items labelled with ``media``'s episode (alone or in a range), no season packs."""
+        if media.episode is None:
+            return []
+        season, ep = media.season, media.episode
+        if season is None:
+            buckets = [self._episodes_any.get(ep), self._ranges_any.get(ep)]
+        else:
+            buckets = [
+                self._episodes.get((season, ep)),
+                self._episodes.get((None, ep)),
+                self._ranges.get((season, ep)),
+                self._ranges.get((None, ep)),
+            ]
+        return [it for bucket in buckets if bucket for it in bucket]
@@ -36,4 +36,4 @@ def parse_media_info(path: Path) -> MediaInfo:
     year: Optional[int] = info.get("year")
     season: Optional[int] = info.get("season")
     episode: Optional[int] = info.get("episode")
-    return MediaInfo(title=title, year=year, season=season, episode=episode)
+    return MediaInfo(title=title, year=year, season=season, episode=episode, stem=path.stem)
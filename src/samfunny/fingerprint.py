@@ -0,0 +1,22 @@
+from __future__ import annotations
+import hashlib
+import mmap
+from pathlib import Path
+
+# Only the head and tail of the file are hashed; the middle is never read.
+CHUNK_SIZE = 64 * 1024
+
+
+def content_fingerprint(path: Path) -> str:
+    """Cheap identity for a video file: size plus hashes of the first/last 64 KB.
+
+    Stable across renames, different for re-encodes (size and container bytes change).
+    """
+    size = path.stat().st_size
+    h = hashlib.sha256()
+    h.update(str(size).encode("ascii"))
+    if size:
+        with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            h.update(mm[:CHUNK_SIZE])
+            h.update(mm[max(size - CHUNK_SIZE, 0):])
+    return f"{size:x}-{h.hexdigest()[:32]}"
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+
+from .filename_parser import parse_media_info
+from .types import MediaInfo
+
+# Bump when parse_media_info changes so stale cached parses are dropped
+PARSER_VERSION = 1
+
+# Below this many uncached names, worker start-up (each imports guessit) costs more than it saves
+_MIN_PARALLEL = 512
+
+
+class IndexRow(NamedTuple):
+    title: str
+    year: Optional[int]
+    season: Optional[int]
+    episode: Optional[int]
+    path: str
+
+    def media_info(self) -> MediaInfo:
+        return MediaInfo(title=self.title, year=self.year, season=self.season, episode=self.episode,
+                         stem=Path(self.path).stem)
+
+
+class ParseCache:
+    """Persistent memo of parse_media_info results keyed by file name."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: dict[str, list] = {}
+        self._dirty = False
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") == PARSER_VERSION:
+            self.entries = data.get("entries", {})
+
+    def get(self, name: str) -> Optional[tuple]:
+        hit = self.entries.get(name)
+        return tuple(hit) if hit is not None else None
+
+    def put(self, name: str, parsed: tuple):
+        self.entries[name] = list(parsed)
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".json.tmp")
+        data = {"version": PARSER_VERSION, "entries": self.entries}
+        tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+def _parse_chunk(names: Sequence[str]) -> List[tuple]:
+    out = []
+    for name in names:
+        info = parse_media_info(Path(name))
+        out.append((info.title, info.year, info.season, info.episode))
+    return out
+
+
+def _chunks(items: Sequence[str], size: int) -> Iterable[Sequence[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def index_library(
+    paths: Iterable[Path],
+    cache: ParseCache | None = None,
+    workers: int | None = None,
+    chunk_size: int = 256,
+) -> List[IndexRow]:
+    """Parse every file name once, in a process pool when there are many uncached names."""
+    paths = list(paths)
+    parsed: dict[str, tuple] = {}
+    missing: List[str] = []
+    for p in paths:
+        hit = cache.get(p.name) if cache is not None else None
+        if hit is not None:
+            parsed[p.name] = hit
+        elif p.name not in parsed:
+            parsed[p.name] = ()
+            missing.append(p.name)
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(missing) >= _MIN_PARALLEL:
+        chunk_size = max(1, min(chunk_size, -(-len(missing) // workers)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = [r for chunk in pool.map(_parse_chunk, _chunks(missing, chunk_size)) for r in chunk]
+    else:
+        results = _parse_chunk(missing)
+
+    for name, res in zip(missing, results):
+        parsed[name] = res
+        if cache is not None:
+            cache.put(name, res)
+
+    return [IndexRow(*parsed[p.name], str(p)) for p in paths]
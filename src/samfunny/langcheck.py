@@ -0,0 +1,126 @@
+from __future__ import annotations
+import codecs
+import re
+from typing import Iterable, NamedTuple, Optional
+
+from .types import Language
+
+# Frequent characters whose Simplified and Traditional forms differ, pairwise aligned.
+# Subtitles are conversational, so these cover a large share of the Han characters seen.
+_SIMPLIFIED = (
+    "们这个来说时会为对没还国过里么开让谁现关见话吗听点经发后问从头样动长东车门间觉认识爱"
+    "钱请谢学应该实当两边难给乐电机亲妈儿岁医办帮带坏记讲进远运样热觉轻买卖书写读别气"
+    "尔种数将场战无与业总结体决农达师术单号务区处义备复变爷图层态虽获欢"
+)
+_TRADITIONAL = (
+    "們這個來說時會為對沒還國過裡麼開讓誰現關見話嗎聽點經發後問從頭樣動長東車門間覺認識愛"
+    "錢請謝學應該實當兩邊難給樂電機親媽兒歲醫辦幫帶壞記講進遠運樣熱覺輕買賣書寫讀別氣"
+    "爾種數將場戰無與業總結體決農達師術單號務區處義備複變爺圖層態雖獲歡"
+)
+
+_SIMP_RE = re.compile("[" + "".join(sorted(set(_SIMPLIFIED) - set(_TRADITIONAL))) + "]")
+_TRAD_RE = re.compile("[" + "".join(sorted(set(_TRADITIONAL) - set(_SIMPLIFIED))) + "]")
+_HAN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+_LATIN_RE = re.compile(r"[A-Za-z\u00c0-\u024f]")
+
+# Dialogue extraction works on the whole text at once rather than line by line
+_ASS_DIALOGUE_RE = re.compile(r"^Dialogue:(?:[^,\n]*,){9}(.*)$", re.MULTILINE)
+_SRT_NOISE_RE = re.compile(r"^\s*\d+\s*$|^\s*\d{1,2}:\d{2}:\d{2}[,.]\d{1,3}\s*-->.*$", re.MULTILINE)
+_TAG_RE = re.compile(r"\{[^}]*\}|<[^>]*>|\\[Nnh]")
+
+# A Han character carries roughly a word; weight Latin letters down accordingly
+_LATIN_PER_HAN = 3.0
+
+
+class LanguageMismatch(RuntimeError):
+    pass
+
+
+class Histogram(NamedTuple):
+    han: int
+    simplified: int
+    traditional: int
+    latin: int
+
+
+def parse_language_list(text: str) -> Optional[list[Language]]:
+    """``"bilingual,simplified"`` -> [BILINGUAL, SIMPLIFIED]; ``"any"`` -> None (no check)."""
+    names = [n.strip().upper() for n in text.split(",") if n.strip()]
+    if not names or names == ["ANY"]:
+        return None
+    try:
+        return [Language[n] for n in names]
+    except KeyError as e:
+        raise ValueError(f"Unknown language: {e.args[0].lower()}") from None
+
+
+def decode_subtitle(data: bytes) -> str:
+    """Decode subtitle bytes once, trying BOMs, UTF-8, then GB18030 vs Big5."""
+    for bom, enc in ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16")):
+        if data.startswith(bom):
+            return data.decode(enc, errors="replace")
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+    # Both legacy encodings accept many of the same byte sequences; keep the reading
+    # in which more characters are frequent ones from either script.
+    best, best_score = None, -1
+    for enc in ("gb18030", "big5"):
+        try:
+            text = data.decode(enc)
+        except UnicodeDecodeError:
+            continue
+        score = len(_SIMP_RE.findall(text)) + len(_TRAD_RE.findall(text))
+        if score > best_score:
+            best, best_score = text, score
+    return best if best is not None else data.decode("utf-8", errors="replace")
+
+
+def dialogue_text(text: str) -> str:
+    """Only the spoken lines: ASS Dialogue text fields, or SRT without indices/timecodes."""
+    lines = _ASS_DIALOGUE_RE.findall(text)
+    body = "\n".join(lines) if lines else _SRT_NOISE_RE.sub("", text)
+    return _TAG_RE.sub(" ", body)
+
+
+def histogram(text: str) -> Histogram:
+    return Histogram(
+        han=len(_HAN_RE.findall(text)),
+        simplified=len(_SIMP_RE.findall(text)),
+        traditional=len(_TRAD_RE.findall(text)),
+        latin=len(_LATIN_RE.findall(text)),
+    )
+
+
+def classify(h: Histogram) -> Optional[Language]:
+    """Language tier from a histogram; Traditional+English counts as TRADITIONAL."""
+    weighted_latin = h.latin / _LATIN_PER_HAN
+    if h.han + weighted_latin == 0:
+        return None
+    han_share = h.han / (h.han + weighted_latin)
+    if han_share < 0.1:
+        return Language.ENGLISH
+    traditional = h.traditional > max(2, h.simplified * 1.5)
+    if traditional:
+        return Language.TRADITIONAL
+    if han_share > 0.9:
+        return Language.SIMPLIFIED
+    return Language.BILINGUAL
+
+
+def detect_language(data: bytes) -> Optional[Language]:
+    return classify(histogram(dialogue_text(decode_subtitle(data))))
+
+
+def verify_language(data: bytes, accept: Iterable[Language]) -> Language | None:
+    """Raise LanguageMismatch unless the subtitle's detected tier is in ``accept``.
+
+    Files whose language cannot be determined (no letters at all) are let through.
+    """
+    detected = detect_language(data)
+    accept = set(accept)
+    if detected is not None and detected not in accept:
+        wanted = "/".join(sorted(l.name.lower() for l in accept))
+        raise LanguageMismatch(f"Subtitle content is {detected.name.lower()}, wanted {wanted}")
+    return detected
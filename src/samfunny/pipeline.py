@@ -0,0 +1,251 @@
+from __future__ import annotations
+import asyncio
+import contextlib
+import heapq
+import itertools
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from .cache import ResultCache, shared_media_key
+from .client import SamfunnyClient
+from .downloader import download_and_place
+from .fingerprint import content_fingerprint
+from .scoring import _format_score
+from .store import BatchWriter
+from .types import Language, MediaInfo, SubFormat, SubtitleItem
+
+if TYPE_CHECKING:
+    from .aio_client import AsyncSamfunnyClient
+
+
+@dataclass
+class Outcome:
+    status: str                     # "placed", "cached", "not_found", "failed" or "dry_run"
+    subtitle: Optional[Path] = None
+    item: Optional[SubtitleItem] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> Optional[bool]:
+        """True/False for a real attempt, None when nothing was attempted (dry run)."""
+        if self.status == "dry_run":
+            return None
+        return self.status in ("placed", "cached")
+
+
+def _check_cache(media: Path, info: MediaInfo, cache: ResultCache | None, dry_run: bool,
+                 log: Callable[[str], None], writer: BatchWriter | None = None,
+                 accept_languages: List[Language] | None = None,
+                 prefer_format: str = "ass") -> Tuple[Optional[str], Optional[Outcome]]:
+    """Content fingerprint of ``media`` and, on a cache hit, the finished outcome.
+
+    Only cached subtitles this run would accept count as hits.
+    """
+    if cache is None:
+        return None, None
+    fingerprint = None
+    try:
+        fingerprint = content_fingerprint(media)
+    except OSError as e:
+        log(f"Fingerprint failed for {media.name}: {e}")
+    cached = cache.lookup(fingerprint, info, accept_languages, prefer_format) if fingerprint else None
+    if not cached:
+        return fingerprint, None
+    if dry_run:
+        log(f"[DRY-RUN] Would reuse cached subtitle: {cached.item.filename_text}")
+        return fingerprint, Outcome("dry_run", item=cached.item)
+    try:
+        out_path = cache.place(cached, media, writer)
+    except Exception as e:
+        # e.g. a read-only folder: carry on as a cache miss
+        log(f"Cached subtitle could not be placed for {media.name}: {e}")
+        return fingerprint, None
+    log(f"Reused cached subtitle: {out_path}")
+    return fingerprint, Outcome("cached", subtitle=out_path, item=cached.item)
+
+
+def _record(cache: ResultCache, fingerprint: str, info: MediaInfo, item: SubtitleItem, out_path: Path,
+            writer: BatchWriter | None, log: Callable[[str], None]):
+    """Cache the placed subtitle; a failure here costs the cache entry, not the subtitle."""
+    try:
+        # A batched write may not have reached out_path yet
+        cache.record(fingerprint, info, item, out_path, data=writer.read(out_path) if writer else None)
+    except Exception as e:
+        log(f"Caching {out_path.name} failed: {e}")
+
+
+def _nonempty(results: Iterable[SubtitleItem]) -> Optional[Iterator[SubtitleItem]]:
+    """``results`` as an iterator, or None when it yields nothing (consumes one item to check)."""
+    it = iter(results)
+    first = next(it, None)
+    return None if first is None else itertools.chain((first,), it)
+
+
+def _keep_best(best: list, key: tuple, item: SubtitleItem, limit: int = 3):
+    """Keep the ``limit`` smallest keys in a max-heap of negated keys."""
+    entry = (tuple(-k for k in key), item)
+    if len(best) < limit:
+        heapq.heappush(best, entry)
+    elif entry[0] > best[0][0]:
+        heapq.heapreplace(best, entry)
+
+
+def download_plan(results: Iterable[SubtitleItem], prefer_format: str) -> List[Tuple[str, int, SubtitleItem]]:
+    """Ordered (kind, attempt number, item) download attempts for a search result.
+
+    One pass over ``results`` keeping only the three best of each kind, so a streamed
+    result set is never materialized or sorted whole.
+    """
+    zip_best: list = []
+    direct_best: list = []
+    for n, item in enumerate(results):
+        name = item.filename_text.lower()
+        downloads = item.download_count or 0
+        # Separate zip files and direct downloads for better handling
+        if item.format == SubFormat.ZIP or '.zip' in name:
+            _keep_best(zip_best, (-downloads, n), item)
+        if item.format in (SubFormat.SRT, SubFormat.ASS) or any(ext in name for ext in ['.srt', '.ass']):
+            _keep_best(direct_best, (-_format_score(item.format, prefer_format), -downloads, n), item)
+
+    # First try all zip files, they are more reliable; if no zip success, try direct downloads
+    zip_attempts = [it for _, it in sorted(zip_best, reverse=True)]
+    direct_attempts = [it for _, it in sorted(direct_best, reverse=True)]
+    return [("ZIP", i, it) for i, it in enumerate(zip_attempts)] + [("Direct", i, it) for i, it in enumerate(direct_attempts)]
+
+
+def process_media(
+    client: SamfunnyClient,
+    media: Path,
+    info: MediaInfo,
+    *,
+    cache: ResultCache | None = None,
+    prefer_format: str = "ass",
+    max_pages: int = 2,
+    accept_languages: List[Language] | None = None,
+    dry_run: bool = False,
+    verbose: bool = False,
+    search: Callable[[MediaInfo], Iterable[SubtitleItem]] | None = None,
+    writer: BatchWriter | None = None,
+    log: Callable[[str], None] = print,
+) -> Outcome:
+    """Find and place a subtitle for one media file.
+
+    ``search`` overrides how candidates are found.
+    Downloads whose text is not in ``accept_languages`` are rejected and the next candidate is tried.
+    With ``writer`` the subtitle is staged and appears when the writer commits its batch.
+    """
+    if verbose:
+        log(f"Parsed: title={info.title}, year={info.year}, episode={info.episode_str}")
+
+    fingerprint, done = _check_cache(media, info, cache, dry_run, log, writer, accept_languages, prefer_format)
+    if done:
+        return done
+
+    log(f"Search query used for Samfunny: {info.title}")
+    try:
+        if search is not None:
+            results = search(info)
+        else:
+            results = client.iter_search(info, max_pages=max_pages)
+    except Exception as e:
+        log(f"Search failed for {media.name}: {e}")
+        return Outcome("failed", error=f"search failed: {e}")
+
+    results = _nonempty(results)
+    if results is None:
+        log("No subtitles found on Samfunny.")
+        return Outcome("not_found")
+
+    last_error = None
+    for kind, i, sub_item in download_plan(results, prefer_format):
+        if dry_run:
+            log(f"[DRY-RUN] Would download: {sub_item.filename_text} ({sub_item.format}) from {sub_item.detail_url}")
+            continue
+
+        try:
+            log(f"Trying {kind} subtitle {i+1}/3: {sub_item.filename_text}")
+            out_path = download_and_place(client.session, sub_item, media, accept_languages=accept_languages,
+                                          media=info, writer=writer)
+        except Exception as e:
+            log(f"{kind} download failed for {sub_item.filename_text}: {e}")
+            last_error = str(e)
+            continue
+        log(f"Saved: {out_path}")
+        if fingerprint:
+            _record(cache, fingerprint, info, sub_item, out_path, writer, log)
+        return Outcome("placed", subtitle=out_path, item=sub_item)
+
+    if dry_run:
+        return Outcome("dry_run")
+    # All attempts failed
+    log(f"All subtitle attempts failed for {media.name}")
+    return Outcome("failed", error=last_error)
+
+
+async def process_media_async(
+    client: "AsyncSamfunnyClient",
+    media: Path,
+    info: MediaInfo,
+    *,
+    cache: ResultCache | None = None,
+    prefer_format: str = "ass",
+    max_pages: int = 2,
+    accept_languages: List[Language] | None = None,
+    dry_run: bool = False,
+    verbose: bool = False,
+    writer: BatchWriter | None = None,
+    log: Callable[[str], None] = print,
+) -> Outcome:
+    """process_media for the asyncio engine; cache and file work run in the default executor.
+
+    With a cache, sibling releases of one episode take turns (see
+    AsyncSamfunnyClient.episode_lock), so the episode is downloaded only once.
+    """
+    loop = asyncio.get_running_loop()
+    key = shared_media_key(info) if cache is not None and not dry_run else None
+    async with client.episode_lock(key) if key else contextlib.nullcontext():
+        if verbose:
+            log(f"Parsed: title={info.title}, year={info.year}, episode={info.episode_str}")
+
+        fingerprint, done = await loop.run_in_executor(None, _check_cache, media, info, cache, dry_run, log, writer,
+                                                       accept_languages, prefer_format)
+        if done:
+            return done
+
+        log(f"Search query used for Samfunny: {info.title}")
+        try:
+            results = await client.iter_search(info, max_pages=max_pages)
+        except Exception as e:
+            log(f"Search failed for {media.name}: {e}")
+            return Outcome("failed", error=f"search failed: {e}")
+
+        results = _nonempty(results)
+        if results is None:
+            log("No subtitles found on Samfunny.")
+            return Outcome("not_found")
+
+        last_error = None
+        for kind, i, sub_item in download_plan(results, prefer_format):
+            if dry_run:
+                log(f"[DRY-RUN] Would download: {sub_item.filename_text} ({sub_item.format}) from {sub_item.detail_url}")
+                continue
+
+            try:
+                log(f"Trying {kind} subtitle {i+1}/3: {sub_item.filename_text}")
+                out_path = await client.download_and_place(sub_item, media, accept_languages=accept_languages,
+                                                           media=info, writer=writer)
+            except Exception as e:
+                log(f"{kind} download failed for {sub_item.filename_text}: {e}")
+                last_error = str(e)
+                continue
+            log(f"Saved: {out_path}")
+            if fingerprint:
+                await loop.run_in_executor(None, _record, cache, fingerprint, info, sub_item, out_path, writer, log)
+            return Outcome("placed", subtitle=out_path, item=sub_item)
+
+        if dry_run:
+            return Outcome("dry_run")
+        # All attempts failed
+        log(f"All subtitle attempts failed for {media.name}")
+        return Outcome("failed", error=last_error)
@@ -0,0 +1,151 @@
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from .episodes import EpisodeIndex
+from .types import MediaInfo, SubtitleItem
+
+_CJK_RE = re.compile(r"[一-鿿]+")
+# Episode markers and everything after them are release details, not title words
+_EPISODE_TAIL_RE = re.compile(r"(?i)(?:^|[\s._-])(?:S\d{1,2}E\d{1,3}|S\d{1,2}|E\d{1,3}|EP\d{1,3}|第.{1,3}[季集]).*$")
+_STEM_TAIL_RE = re.compile(r"(?i)[\s._-](?:(?:19|20)\d{2}|\d{3,4}p|S\d{1,2}E\d{1,3}|S\d{1,2}|E\d{1,3}|WEB|BluRay|HDTV)(?![A-Za-z0-9]).*$")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+def optimized_query(title: str) -> str:
+    # Optimize query: use only Chinese part for better search results
+    # If title contains multiple languages (has both Chinese and non-Chinese characters), 
+    # extract only the Chinese part for search
+    chinese_part = ''.join([c for c in title if '\u4e00' <= c <= '\u9fff']).strip()
+    if chinese_part and len(chinese_part) < len(title):
+        return chinese_part
+    return title
+
+
+def _clean(text: str) -> str:
+    text = _EPISODE_TAIL_RE.sub("", text)
+    return " ".join(re.sub(r"[._\-\[\]()]+", " ", text).split())
+
+
+def plan_queries(media: MediaInfo) -> List[str]:
+    """Search variants for a title, most likely first.
+
+    1. the Chinese part of the title (the single query used historically),
+    2. the English part of the title,
+    3. English title + year,
+    4. the file stem up to the first release token (for titles guessit mangles).
+    """
+    title = media.title.strip()
+    variants = [optimized_query(title)]
+    english = _clean(_CJK_RE.sub(" ", title))
+    if english:
+        variants.append(english)
+    if media.year:
+        variants.append(f"{english or _clean(title)} {media.year}")
+    if media.stem:
+        variants.append(_clean(_STEM_TAIL_RE.sub("", media.stem)))
+
+    planned: List[str] = []
+    seen = set()
+    for v in variants:
+        key = normalize_query(v)
+        if key and key not in seen:
+            seen.add(key)
+            planned.append(v.strip())
+    return planned
+
+
+class QueryMemory:
+    """Which query variant found subtitles for each series, persisted between runs."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._queries: dict[str, str] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        try:
+            self._queries = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+
+    def get(self, series: str) -> Optional[str]:
+        return self._queries.get(series)
+
+    def remember(self, series: str, query: str):
+        with self._lock:
+            if self._queries.get(series) != query:
+                self._queries[series] = query
+                self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps(self._queries, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+class FanoutSearch:
+    """Multi-query search state for one series, shared by all of its episodes.
+
+    The first wave is the single most likely (or remembered) query. Only when it
+    gives no strong hits are the remaining variants issued together; their detail
+    URLs are merged and de-duplicated before any detail page is fetched, and
+    fetching stops as soon as the wanted episode has strong hits.
+    """
+
+    def __init__(self, variants: Iterable[str], remembered: Optional[str] = None):
+        variants = list(variants)
+        if remembered:
+            variants = [remembered] + [v for v in variants if normalize_query(v) != normalize_query(remembered)]
+        self.pending = variants
+        self.queued: List[Tuple[str, str]] = []     # (query, detail URL) not fetched yet
+        self.index = EpisodeIndex()
+        self.created = time.monotonic()
+        self._waves = 0
+        self._details: set = set()
+        self._downloads: set = set()
+
+    def satisfied(self, media: MediaInfo) -> bool:
+        """Strong hits: items labelled with this exact episode (or any item for a movie)."""
+        if media.episode is None:
+            return len(self.index) > 0
+        return bool(self.index.exact_candidates(media))
+
+    def next_wave(self) -> List[str]:
+        n = 1 if self._waves == 0 else len(self.pending)
+        wave, self.pending = self.pending[:n], self.pending[n:]
+        self._waves += 1
+        return wave
+
+    def retry(self, queries: Iterable[str] = (), details: Iterable[Tuple[str, str]] = ()):
+        """Put back list searches and detail pages that failed (e.g. a network error),
+        so the next episode of the series tries them again."""
+        queries = [q for q in queries if q not in self.pending]
+        if queries:
+            self.pending[:0] = queries
+            self._waves = max(self._waves - 1, 0)
+        self.queued.extend(details)
+
+    def enqueue(self, query: str, urls: Iterable[str]):
+        for url in urls:
+            if url not in self._details:
+                self._details.add(url)
+                self.queued.append((query, url))
+
+    def add_items(self, items: Iterable[SubtitleItem]):
+        for item in items:
+            if item.download_url not in self._downloads:
+                self._downloads.add(item.download_url)
+                self.index.add(item)
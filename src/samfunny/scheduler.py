@@ -0,0 +1,145 @@
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+# Files modified on the same day are treated as equally new, so the series
+# hit rate can break ties within a day instead of mtime seconds deciding everything.
+_DAY = 86400
+
+
+def parse_duration(text: str) -> float:
+    """Parse ``90``, ``90s``, ``45m``, ``2h`` or ``1h30m`` into seconds."""
+    text = text.strip().lower()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)([hms])", text)
+    if not parts or "".join(n + u for n, u in parts) != text:
+        raise ValueError(f"Invalid duration: {text!r}")
+    scale = {"h": 3600, "m": 60, "s": 1}
+    return sum(float(n) * scale[u] for n, u in parts)
+
+
+class RunState:
+    """Per-file attempt history and per-series hit counts, persisted between runs.
+
+    ``state.json`` layout::
+
+        {"files": {path: {"status": "ok"|"failed", "attempts": n, "last": ts}},
+         "series": {series_key: {"hits": n, "misses": n}},
+         "subtitles": {subtitle_path: "partial"|"complete"},
+         "deferred": [path, ...]}
+
+    A subtitle is "partial" from the moment its write is staged until the batch holding
+    it is committed; one left partial is redone instead of counted as existing. The file
+    is saved before every commit, so the marker is on disk before the rename it guards.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.files: dict[str, dict] = {}
+        self.series: dict[str, dict] = {}
+        self.subtitles: dict[str, str] = {}
+        self.deferred: list[str] = []
+        # Subtitle markers and saves also come from BatchWriter callbacks on worker threads
+        self._lock = threading.Lock()
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        self.files = data.get("files", {})
+        self.series = data.get("series", {})
+        self.subtitles = data.get("subtitles", {})
+        self.deferred = data.get("deferred", [])
+
+    def previously_failed(self, media: Path) -> bool:
+        return self.files.get(str(media), {}).get("status") == "failed"
+
+    def attempts(self, media: Path) -> int:
+        return self.files.get(str(media), {}).get("attempts", 0)
+
+    def hit_rate(self, series_key: str) -> float:
+        s = self.series.get(series_key, {})
+        hits, misses = s.get("hits", 0), s.get("misses", 0)
+        # Laplace smoothing: unseen series rank at 0.5
+        return (hits + 1) / (hits + misses + 2)
+
+    def record(self, media: Path, series_key: str, ok: bool):
+        with self._lock:
+            entry = self.files.setdefault(str(media), {})
+            entry["status"] = "ok" if ok else "failed"
+            entry["attempts"] = entry.get("attempts", 0) + 1
+            entry["last"] = time.time()
+            s = self.series.setdefault(series_key, {"hits": 0, "misses": 0})
+            s["hits" if ok else "misses"] += 1
+
+    def mark_partial(self, subtitle: Path):
+        with self._lock:
+            self.subtitles[str(subtitle)] = "partial"
+
+    def mark_complete(self, subtitles: Iterable[Path]):
+        with self._lock:
+            for p in subtitles:
+                self.subtitles[str(p)] = "complete"
+
+    def subtitle_complete(self, subtitle: Path) -> bool:
+        """False for a subtitle whose last write never committed; files we never wrote count as complete."""
+        return self.subtitles.get(str(subtitle)) != "partial"
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".json.tmp")
+        with self._lock:
+            data = {"files": self.files, "series": self.series, "subtitles": self.subtitles,
+                    "deferred": self.deferred}
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+@dataclass
+class Budget:
+    """Wall-clock and request budget for one run; ``None`` means unlimited."""
+    deadline: Optional[float] = None       # seconds from start
+    max_requests: Optional[int] = None
+    started: float = field(default_factory=time.monotonic)
+
+    def exhausted(self, requests_used: int) -> Optional[str]:
+        if self.deadline is not None and time.monotonic() - self.started >= self.deadline:
+            return f"deadline of {self.deadline:g}s reached"
+        if self.max_requests is not None and requests_used >= self.max_requests:
+            return f"request budget of {self.max_requests} used"
+        return None
+
+
+def schedule(files: Iterable[Path], state: RunState, series_of: Callable[[Path], str]) -> List[Path]:
+    """Order files by priority.
+
+    1. never attempted (or previously succeeded) before previously failed,
+       failed files with fewer attempts first;
+    2. newest modification day first;
+    3. series with a higher hit rate first;
+    4. newest mtime first.
+    """
+    def _key(p: Path):
+        try:
+            mtime = p.stat().st_mtime
+        except OSError:
+            mtime = 0.0
+        failed = state.previously_failed(p)
+        return (
+            failed,
+            state.attempts(p) if failed else 0,
+            -int(mtime // _DAY),
+            -state.hit_rate(series_of(p)),
+            -mtime,
+            str(p),
+        )
+
+    return sorted(files, key=_key)
@@ -12,16 +12,16 @@ FORMAT_WEIGHT = {
 }
 
 LANG_GROUP_ORDER = [
-    [Language.BILINGUAL],
-    [Language.SIMPLIFIED],
-    [Language.ENGLISH],
-    [Language.TRADITIONAL],
+    Language.BILINGUAL,
+    Language.SIMPLIFIED,
+    Language.ENGLISH,
+    Language.TRADITIONAL,
 ]
 
 
-def _group_key(langs: list[Language]) -> int:
+def _group_key(langs: Language) -> int:
     for idx, group in enumerate(LANG_GROUP_ORDER):
-        if any(l in langs for l in group):
+        if group & langs:
             return idx
     return 999
 
@@ -0,0 +1,151 @@
+from __future__ import annotations
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List
+
+from .cache import ResultCache, item_to_dict
+from .client import SamfunnyClient
+from .filename_parser import parse_media_info
+from .pipeline import process_media
+from .store import BatchWriter
+from .types import Language
+
+
+class SubtitleService:
+    """Keeps one warm client and cache for many "find subtitles for these paths" calls.
+
+    Concurrent requests for episodes of one series share a single search: the client
+    serializes them per series and the later callers reuse the results. Searches older
+    than ``search_ttl`` seconds are redone so new uploads show up.
+    """
+
+    def __init__(self, client: SamfunnyClient, cache: ResultCache | None = None,
+                 max_pages: int = 2, prefer_format: str = "ass", verbose: bool = False,
+                 accept_languages: List[Language] | None = None, search_ttl: float = 600.0):
+        self.client = client
+        self.cache = cache
+        self.max_pages = max_pages
+        self.prefer_format = prefer_format
+        self.accept_languages = accept_languages
+        self.verbose = verbose
+        if client.search_ttl is None:
+            client.search_ttl = search_ttl
+
+    def _log(self, msg: str):
+        if self.verbose:
+            print(msg)
+
+    def find(self, path: Path, dry_run: bool = False, writer: BatchWriter | None = None) -> dict:
+        result: dict = {"path": str(path)}
+        if not path.is_file():
+            return {**result, "status": "missing"}
+        for ext in (".ass", ".srt"):
+            if path.with_suffix(ext).exists():
+                return {**result, "status": "exists", "subtitle": str(path.with_suffix(ext))}
+        info = parse_media_info(path)
+        outcome = process_media(
+            self.client,
+            path,
+            info,
+            cache=self.cache,
+            prefer_format=self.prefer_format,
+            max_pages=self.max_pages,
+            accept_languages=self.accept_languages,
+            dry_run=dry_run,
+            verbose=self.verbose,
+            writer=writer,
+            log=self._log,
+        )
+        result["status"] = outcome.status
+        if outcome.subtitle:
+            result["subtitle"] = str(outcome.subtitle)
+        if outcome.item:
+            result["item"] = item_to_dict(outcome.item)
+        if outcome.error:
+            result["error"] = outcome.error
+        return result
+
+    def handle(self, paths: List[str], dry_run: bool = False) -> List[dict]:
+        # A writer per request: once its flush returns, every subtitle this request placed
+        # has been renamed into place (or is listed in writer.failed)
+        writer = BatchWriter()
+        try:
+            results = [self.find(Path(p), dry_run=dry_run, writer=writer) for p in paths]
+        finally:
+            writer.flush()
+            if self.cache is not None and not dry_run:
+                self.cache.save()
+        failed = {str(p) for p in writer.failed}
+        for result in results:
+            if result.get("subtitle") in failed:
+                result["status"] = "failed"
+                result["error"] = "subtitle could not be written"
+        return results
+
+
+def make_server(service: SubtitleService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """HTTP/JSON front end.
+
+    ``POST /subtitles`` with ``{"paths": [...], "dry_run": false}`` returns ``{"results": [...]}``;
+    ``GET /health`` returns ``{"ok": true}``.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, payload: dict):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"ok": True})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/subtitles":
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                req = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(req, dict):
+                    raise ValueError("body must be a JSON object")
+                paths = req["paths"]
+                if not isinstance(paths, list):
+                    raise ValueError("paths must be a list")
+            except (ValueError, KeyError) as e:
+                self._reply(400, {"error": f"bad request: {e}"})
+                return
+            results = service.handle([str(p) for p in paths], dry_run=bool(req.get("dry_run")))
+            self._reply(200, {"results": results})
+
+        def log_message(self, format, *args):
+            if service.verbose:
+                super().log_message(format, *args)
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def serve(client: SamfunnyClient, cache: ResultCache | None, host: str = "127.0.0.1", port: int = 8765,
+          max_pages: int = 2, prefer_format: str = "ass", verbose: bool = False,
+          accept_languages: List[Language] | None = None):
+    service = SubtitleService(client, cache, max_pages=max_pages, prefer_format=prefer_format,
+                              verbose=verbose, accept_languages=accept_languages)
+    client.warmup()
+    server = make_server(service, host, port)
+    print(f"zimu service listening on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if cache is not None:
+            cache.save()
+        if client.query_memory is not None:
+            client.query_memory.save()
@@ -0,0 +1,288 @@
+from __future__ import annotations
+import hashlib
+import os
+import shutil
+import stat
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+# Linux FICLONE ioctl (btrfs, xfs with reflink=1, ...)
+_FICLONE = 0x40049409
+
+TMP_SUFFIX = ".zimu-tmp"
+# Temp files younger than this may belong to a run still in progress
+_STALE_TMP_AGE = 3600.0
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        return True
+    except OSError:
+        try:
+            dst.unlink()
+        except OSError:
+            pass
+        return False
+
+
+def _tmp_path(dest: Path) -> Path:
+    """Temp file next to ``dest``, unique per process and thread."""
+    return dest.with_name(f".{dest.name}.{os.getpid()}.{threading.get_ident()}{TMP_SUFFIX}")
+
+
+def _unlink(path: Path):
+    try:
+        path.unlink()
+    except OSError:
+        pass
+
+
+def _fsync(path: Path):
+    if path.is_dir():
+        # Directories cannot be opened for fsync on Windows; a rename there is already ordered
+        if os.name == "nt":
+            return
+        flags = os.O_RDONLY
+    else:
+        # Windows only flushes a handle opened for writing (EBADF otherwise)
+        flags = os.O_RDWR
+    fd = os.open(path, flags)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def cleanup_temp_files(directories: Iterable[Path], max_age: float = _STALE_TMP_AGE) -> int:
+    """Remove temp files left in ``directories`` by interrupted runs; returns how many.
+
+    Only files older than ``max_age`` seconds go, so a concurrent run keeps its own.
+    """
+    now = time.time()
+    removed = 0
+    for directory in directories:
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if not (entry.name.startswith(".") and entry.name.endswith(TMP_SUFFIX)):
+                continue
+            try:
+                if now - entry.stat().st_mtime >= max_age:
+                    os.unlink(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def _same_content(path: Path, data: bytes) -> bool:
+    try:
+        if path.stat().st_size != len(data):
+            return False
+        return path.read_bytes() == data
+    except OSError:
+        return False
+
+
+def write_if_changed(path: Path, data: bytes, writer: Optional["BatchWriter"] = None) -> bool:
+    """Write ``data`` to ``path`` unless it already holds exactly these bytes.
+
+    The bytes go to a temp file in the same directory that is renamed over ``path``, so
+    ``path`` never holds a partial file. With ``writer`` the rename waits for its batch.
+    """
+    if _same_content(path, data):
+        return False
+    if writer is not None:
+        writer.stage_bytes(path, data)
+        return True
+    tmp = _tmp_path(path)
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except BaseException:
+        _unlink(tmp)
+        raise
+    return True
+
+
+class BatchWriter:
+    """Stages subtitle writes and commits them a directory at a time.
+
+    Each write lands in a temp file next to its destination. Committing a directory
+    fsyncs its staged files, renames each over its destination and fsyncs the directory
+    once, so a crash leaves the old file or the complete new one, never a truncated one,
+    plus at most a temp file for ``cleanup_temp_files``. A directory is committed when
+    it has ``batch_size`` staged files; ``flush(due_only=True)`` commits the ones whose
+    oldest write has waited ``max_delay`` seconds, ``flush()`` commits everything.
+
+    ``on_stage(dest)`` and ``on_commit(dests)`` let the caller track which destinations
+    are still partial; ``before_commit()`` runs ahead of each directory's renames, so that
+    record can be persisted while the renames are still pending. A destination whose commit fails is reported, listed in ``failed``
+    and left out of ``on_commit``, so it stays partial and is redone by the next run.
+    """
+
+    def __init__(self, batch_size: int = 16, max_delay: float = 5.0,
+                 on_stage: Optional[Callable[[Path], None]] = None,
+                 on_commit: Optional[Callable[[List[Path]], None]] = None,
+                 before_commit: Optional[Callable[[], None]] = None):
+        self.batch_size = max(batch_size, 1)
+        self.max_delay = max_delay
+        self.on_stage = on_stage
+        self.on_commit = on_commit
+        self.before_commit = before_commit
+        self._pending: dict[Path, dict[Path, Path]] = {}   # directory -> {dest: temp file}
+        self._since: dict[Path, float] = {}
+        self.failed: List[Path] = []
+        self._lock = threading.Lock()
+
+    def stage_bytes(self, dest: Path, data: bytes):
+        tmp = _tmp_path(dest)
+        try:
+            tmp.write_bytes(data)
+        except BaseException:
+            _unlink(tmp)
+            raise
+        self.stage_file(dest, tmp)
+
+    def stage_file(self, dest: Path, tmp: Path):
+        """Take over ``tmp`` (already in ``dest``'s directory) as the next content of ``dest``."""
+        directory = dest.parent
+        with self._lock:
+            batch = self._pending.setdefault(directory, {})
+            previous = batch.pop(dest, None)
+            batch[dest] = tmp
+            self._since.setdefault(directory, time.monotonic())
+            full = len(batch) >= self.batch_size
+        if previous is not None and previous != tmp:
+            _unlink(previous)
+        if self.on_stage:
+            self.on_stage(dest)
+        if full:
+            self._commit(directory)
+
+    def read(self, path: Path) -> bytes:
+        """Current bytes for ``path``: the staged content if a write is pending."""
+        with self._lock:
+            tmp = self._pending.get(path.parent, {}).get(path)
+        if tmp is not None:
+            try:
+                return tmp.read_bytes()
+            except FileNotFoundError:
+                pass  # committed meanwhile
+        return path.read_bytes()
+
+    def _commit(self, directory: Path):
+        with self._lock:
+            batch = self._pending.pop(directory, {})
+            self._since.pop(directory, None)
+        if not batch:
+            return
+        if self.before_commit:
+            self.before_commit()
+        committed: List[Path] = []
+        for dest, tmp in batch.items():
+            try:
+                _fsync(tmp)
+                os.replace(tmp, dest)
+                committed.append(dest)
+            except OSError as e:
+                _unlink(tmp)
+                print(f"Failed to write {dest}: {e}")
+                with self._lock:
+                    self.failed.append(dest)
+        if committed:
+            try:
+                _fsync(directory)
+            except OSError:
+                pass
+            if self.on_commit:
+                self.on_commit(committed)
+
+    def flush(self, due_only: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            directories = [d for d, t in self._since.items() if not due_only or now - t >= self.max_delay]
+        for directory in directories:
+            self._commit(directory)
+
+
+class SubtitleStore:
+    """Content-addressed store of every downloaded subtitle.
+
+    Objects live at ``objects/<sha256[:2]>/<sha256>`` and are read-only. Placement
+    reflinks the object next to the video, falling back to a copy, so sibling releases
+    of one episode share a single download. Never a hardlink: the placed subtitle is
+    the user's to edit, and editing a link in place would rewrite the object too.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.objects_dir = root / "objects"
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def has(self, digest: str) -> bool:
+        return self.object_path(digest).is_file()
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        obj = self.object_path(digest)
+        if not obj.exists():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            tmp = _tmp_path(obj)
+            try:
+                # Durable before it appears under its digest: has() trusts any file there
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(tmp, obj)
+            except BaseException:
+                _unlink(tmp)
+                raise
+            try:
+                _fsync(obj.parent)
+            except OSError:
+                pass
+        return digest
+
+    def read(self, digest: str) -> bytes:
+        return self.object_path(digest).read_bytes()
+
+    def place(self, digest: str, dest: Path, writer: Optional[BatchWriter] = None) -> bool:
+        """Materialize object ``digest`` at ``dest``. Returns False if ``dest`` already had it.
+
+        With ``writer`` the copy is staged and renamed into place with its batch.
+        """
+        obj = self.object_path(digest)
+        if _same_content(dest, obj.read_bytes()):
+            return False
+        tmp = _tmp_path(dest)
+        _unlink(tmp)
+        if not _reflink(obj, tmp):
+            shutil.copyfile(obj, tmp)
+        if writer is not None:
+            writer.stage_file(dest, tmp)
+        else:
+            os.replace(tmp, dest)
+        return True
+
+    def cleanup_temp_files(self) -> int:
+        """Remove stale temp files from interrupted writes into the object store."""
+        try:
+            shards = [d for d in self.objects_dir.iterdir() if d.is_dir()]
+        except OSError:
+            return 0
+        return cleanup_temp_files(shards)
@@ -1,11 +1,16 @@
 from __future__ import annotations
+import sys
 from dataclasses import dataclass
-from enum import Enum, auto
+from enum import Enum, Flag, auto
 from pathlib import Path
 from typing import Optional
 
 
-class Language(Enum):
+class Language(Flag):
+    """Subtitle languages; an item's languages are a bit set (``Language(0)`` when unknown).
+
+    Members are declared in preference order.
+    """
     BILINGUAL = auto()
     SIMPLIFIED = auto()
     ENGLISH = auto()
@@ -20,12 +25,14 @@ class SubFormat(Enum):
     OTHER = auto()
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class MediaInfo:
     title: str
     year: Optional[int]
     season: Optional[int]
     episode: Optional[int]
+    # File name without extension, kept for the stem search variant
+    stem: Optional[str] = None
 
     @property
     def episode_str(self) -> Optional[str]:
@@ -34,12 +41,13 @@ class MediaInfo:
         return f"S{self.season:02d}E{self.episode:02d}"
 
 
-@dataclass
+# Frozen and slotted: a season or catalog search can hold tens of thousands of these.
+@dataclass(frozen=True, slots=True)
 class SubtitleItem:
     detail_url: str
     download_url: str
     filename_text: str
-    languages: list[Language]
+    languages: Language
     format: SubFormat
     referer: str
     is_bilingual: bool
@@ -47,3 +55,8 @@ class SubtitleItem:
     size_text: str | None = None
     source_text: str | None = None
     score_hint: int = 0
+
+    def __post_init__(self):
+        # Every row of a detail page shares these; keep one copy however the item was built
+        object.__setattr__(self, "detail_url", sys.intern(self.detail_url))
+        object.__setattr__(self, "referer", sys.intern(self.referer))
@@ -0,0 +1,121 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from samfunny.types import Language, SubFormat, SubtitleItem
+
+
+SRT_TEMPLATE = "1\n00:00:01,000 --> 00:00:03,000\n{line}\nHello there\n\n2\n00:00:04,000 --> 00:00:06,000\n{line}\nGeneral Kenobi\n"
+
+
+@pytest.fixture
+def make_item():
+    """Factory for SubtitleItems; every item comes from one detail page."""
+    def make(label: str = "Show.S01E02.chs&eng.ass", fmt: SubFormat = SubFormat.ASS,
+             downloads: int | None = None, languages: Language = Language.BILINGUAL) -> SubtitleItem:
+        detail = "".join(["https://x/d/", "1.html"])  # a fresh string per row, as parsed or loaded
+        return SubtitleItem(
+            detail_url=detail, download_url=f"https://x/{label}", filename_text=label,
+            languages=languages, format=fmt, referer=detail, is_bilingual=True, download_count=downloads,
+        )
+    return make
+
+
+class StandinSite:
+    """Minimal local imitation of samfunny.com: one title ("Severance") with a few episode subtitles."""
+
+    def __init__(self):
+        self.hits: list[str] = []
+        self.lock = threading.Lock()
+        self.delay = 0.0
+        # path prefix -> how many more requests to answer with 503
+        self.failures: dict[str, int] = {}
+        # detail pages listed for the title; each lists every file
+        self.detail_pages = ["/download/100.html"]
+        # download path -> (link text, body)
+        self.files = {
+            f"/download/token/{ep}.sub": (f"Severance.S01E{ep:02d}.chs&eng.srt", SRT_TEMPLATE.format(line="我们走吧").encode("utf-8"))
+            for ep in (1, 2, 3)
+        }
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def count(self, prefix: str) -> int:
+        with self.lock:
+            return sum(1 for h in self.hits if h.startswith(prefix))
+
+    def fail_next(self, prefix: str, times: int = 1):
+        self.failures[prefix] = times
+
+    def _should_fail(self, path: str) -> bool:
+        with self.lock:
+            for prefix, left in self.failures.items():
+                if left and path.startswith(prefix):
+                    self.failures[prefix] = left - 1
+                    return True
+        return False
+
+    def list_page(self, query: str) -> str:
+        if "severance" not in query.lower():
+            return "<html><body>no results</body></html>"
+        links = "".join(f'<a href="{href}">Severance 第一季</a>' for href in self.detail_pages)
+        return f"<html><body>{links}</body></html>"
+
+    def detail_page(self) -> str:
+        rows = "".join(
+            f'<li><img src="/img/jollyroger.gif"/><a href="{href}">{text}</a>'
+            f'<div class="shu"><span>{10 + i}</span></div></li>'
+            for i, (href, (text, _)) in enumerate(self.files.items())
+        )
+        return f'<html><body><h3>字幕文件下载</h3><div class="list"><ul>{rows}</ul></div></body></html>'
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, body: bytes, ctype: str = "text/html; charset=utf-8"):
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with site.lock:
+                    site.hits.append(self.path)
+                if site.delay:
+                    threading.Event().wait(site.delay)
+                if site._should_fail(self.path):
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                url = urlparse(self.path)
+                if url.path == "/download/xslist.php":
+                    query = parse_qs(url.query).get("key", [""])[0]
+                    self._send(site.list_page(query).encode("utf-8"))
+                elif url.path.endswith(".html"):
+                    self._send(site.detail_page().encode("utf-8"))
+                elif url.path in site.files:
+                    self._send(site.files[url.path][1], "application/octet-stream")
+                else:
+                    self._send(b"<html>home</html>")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def standin_site():
+    site = StandinSite()
+    t = threading.Thread(target=site.server.serve_forever, daemon=True)
+    t.start()
+    try:
+        yield site
+    finally:
+        site.server.shutdown()
+        site.server.server_close()
@@ -0,0 +1,65 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from samfunny.aio_client import AsyncSamfunnyClient
+from samfunny.cache import ResultCache
+from samfunny.client import SamfunnyClient
+from samfunny.pipeline import process_media_async
+from samfunny.types import MediaInfo
+
+
+def test_async_client_matches_sync_and_shares_searches(tmp_path: Path, standin_site):
+    media = [MediaInfo("Severance", None, 1, ep) for ep in (1, 2, 3)]
+    sync_items = SamfunnyClient(rate_limit=0, base_url=standin_site.base_url).search_and_collect(media[1], max_pages=1)
+    list_hits = standin_site.count("/download/xslist.php")
+
+    async def run():
+        async with AsyncSamfunnyClient(rate_limit=0, base_url=standin_site.base_url) as client:
+            results = await asyncio.gather(*(client.search_and_collect(m, max_pages=1) for m in media))
+            return client, results
+
+    client, results = asyncio.run(run())
+    assert [it.download_url for it in results[1]] == [it.download_url for it in sync_items]
+    assert [r[0].filename_text for r in results] == [f"Severance.S01E0{ep}.chs&eng.srt" for ep in (1, 2, 3)]
+    # Three concurrent episodes of one title: a single list-page fetch
+    assert standin_site.count("/download/xslist.php") - list_hits == 1
+
+
+def test_async_pipeline_places_subtitles(tmp_path: Path, standin_site):
+    videos = [tmp_path / f"Severance.S01E0{ep}.1080p.mkv" for ep in (1, 2)]
+
+    async def run():
+        async with AsyncSamfunnyClient(rate_limit=0, base_url=standin_site.base_url) as client:
+            return await asyncio.gather(*(
+                process_media_async(client, v, MediaInfo("Severance", None, 1, ep), max_pages=1, log=lambda m: None)
+                for ep, v in enumerate(videos, start=1)
+            ))
+
+    outcomes = asyncio.run(run())
+    assert [o.status for o in outcomes] == ["placed", "placed"]
+    for v in videos:
+        assert v.with_suffix(".srt").exists()
+
+
+def test_async_sibling_releases_share_one_download(tmp_path: Path, standin_site):
+    videos = [tmp_path / f"Severance.S01E01.{res}.mkv" for res in ("1080p", "2160p")]
+    for i, v in enumerate(videos):
+        v.write_bytes(bytes([i]) * 1024)
+    cache = ResultCache(tmp_path / "cache")
+
+    async def run():
+        async with AsyncSamfunnyClient(rate_limit=0, base_url=standin_site.base_url) as client:
+            return await asyncio.gather(*(
+                process_media_async(client, v, MediaInfo("Severance", None, 1, 1), cache=cache, max_pages=1,
+                                    log=lambda m: None)
+                for v in videos
+            ))
+
+    outcomes = asyncio.run(run())
+    assert sorted(o.status for o in outcomes) == ["cached", "placed"]
+    assert standin_site.count("/download/token/1.sub") == 1
+    assert all(v.with_suffix(".srt").exists() for v in videos)
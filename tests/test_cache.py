@@ -0,0 +1,72 @@
+from pathlib import Path
+
+from samfunny.cache import ResultCache
+from samfunny.fingerprint import content_fingerprint, CHUNK_SIZE
+from samfunny.types import Language, MediaInfo
+
+
+def test_fingerprint_survives_rename(tmp_path: Path):
+    video = tmp_path / "a.mkv"
+    video.write_bytes(b"x" * (3 * CHUNK_SIZE) + b"tail")
+    fp = content_fingerprint(video)
+    renamed = video.rename(tmp_path / "b.mkv")
+    assert content_fingerprint(renamed) == fp
+    renamed.write_bytes(b"x" * (3 * CHUNK_SIZE) + b"TAIL")
+    assert content_fingerprint(renamed) != fp
+
+
+def test_cache_reuses_by_fingerprint_and_media_key(tmp_path: Path, make_item):
+    media = MediaInfo(title="Show", year=None, season=1, episode=2)
+    sub = tmp_path / "Show.S01E02.1080p.ass"
+    sub.write_bytes(b"[Script Info]\n")
+
+    cache = ResultCache(tmp_path / "cache")
+    cache.record("fp-1080p", media, make_item(), sub)
+    cache.save()
+
+    reloaded = ResultCache(tmp_path / "cache")
+    # Sibling release of the same episode: unknown fingerprint, same parsed key
+    entry = reloaded.lookup("fp-2160p", MediaInfo(title="show", year=None, season=1, episode=2))
+    assert entry is not None and entry.item.languages == Language.BILINGUAL
+    out = reloaded.place(entry, tmp_path / "Show.S01E02.2160p.mkv")
+    assert out.suffix == ".ass" and out.read_bytes() == b"[Script Info]\n"
+    # Renamed file whose new name parses differently still hits by fingerprint
+    assert reloaded.lookup("fp-1080p", MediaInfo(title="Other", year=None, season=None, episode=None)) is not None
+    assert reloaded.lookup("fp-x", MediaInfo(title="Other", year=None, season=None, episode=None)) is None
+
+
+def test_cache_needs_fingerprint_when_key_is_ambiguous(tmp_path: Path, make_item):
+    # Date-based shows parse to no season or episode: every airing shares one media key
+    sub = tmp_path / "The.Daily.Show.2024.03.05.ass"
+    sub.write_bytes(b"[Script Info]\n")
+    cache = ResultCache(tmp_path / "cache")
+    cache.record("fp-0305", MediaInfo(title="The Daily Show", year=None, season=None, episode=None), make_item(), sub)
+
+    other_night = MediaInfo(title="The Daily Show", year=None, season=None, episode=None)
+    assert cache.lookup("fp-0306", other_night) is None
+    assert cache.lookup("fp-0305", other_night) is not None
+    # A movie with a year is a single video, so a sibling release still shares it
+    movie = MediaInfo(title="Film", year=2020, season=None, episode=None)
+    cache.record("fp-1080p", movie, make_item(), sub)
+    assert cache.lookup("fp-2160p", movie) is not None
+
+
+def test_cache_honours_accepted_languages_and_format(tmp_path: Path, make_item):
+    media = MediaInfo(title="Show", year=None, season=1, episode=2)
+    traditional = tmp_path / "Show.S01E02.srt"
+    traditional.write_text("1\n00:00:01,000 --> 00:00:02,000\n我們現在就走吧，這個問題沒關係\n", encoding="utf-8")
+    cache = ResultCache(tmp_path / "cache")
+    cache.record("fp-1", media, make_item(), traditional)  # e.g. recorded by an --accept-lang any run
+
+    default = [Language.BILINGUAL, Language.SIMPLIFIED]
+    assert cache.lookup("fp-1", media, default) is None
+    assert cache.lookup("fp-1", media).suffix == ".srt"
+
+    simplified = tmp_path / "Show.S01E02.ass"
+    simplified.write_text("[Events]\nDialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,我们现在就走吧，这个问题没关系\n",
+                          encoding="utf-8")
+    cache.record("fp-1", media, make_item(), simplified)
+    assert cache.lookup("fp-1", media, default, "srt").suffix == ".ass"
+    assert cache.lookup("fp-2", media, None, "srt").suffix == ".srt"
+    cache.save()
+    assert ResultCache(tmp_path / "cache").lookup("fp-1", media, [Language.TRADITIONAL]).suffix == ".srt"
@@ -0,0 +1,42 @@
+import io
+import zipfile
+
+from samfunny.downloader import _pick_from_zip
+from samfunny.episodes import EPISODE, RANGE, SEASON, UNKNOWN, Coverage, EpisodeIndex, parse_coverage
+from samfunny.types import MediaInfo
+
+
+def test_parse_coverage_forms():
+    assert parse_coverage("Show.S01E05.1080p.chs&eng.ass") == Coverage(EPISODE, 1, 5, 5)
+    assert parse_coverage("Show.S01E01-E03.WEB.srt") == Coverage(RANGE, 1, 1, 3)
+    assert parse_coverage("Show.S02E01E02.srt") == Coverage(RANGE, 2, 1, 2)
+    assert parse_coverage("Show.S01E05-480p.srt") == Coverage(EPISODE, 1, 5, 5)
+    assert parse_coverage("Show.S01E01-03.720P.srt") == Coverage(RANGE, 1, 1, 3)
+    assert parse_coverage("Show.E05.HDTV.x264.srt") == Coverage(EPISODE, None, 5, 5)
+    assert parse_coverage("某剧 第二季 第05集 简体") == Coverage(EPISODE, 2, 5, 5)
+    assert parse_coverage("某剧 第1-10集 中英") == Coverage(RANGE, None, 1, 10)
+    assert parse_coverage("Show.S01.1080p.BluRay.zip") == Coverage(SEASON, 1)
+    assert parse_coverage("某剧 第一季 全集") == Coverage(SEASON, 1)
+    assert parse_coverage("Interstellar.2014.1080p.BluRay.srt").kind == UNKNOWN
+
+
+def test_index_candidates_per_episode(make_item):
+    labels = ["Show.S01E02.srt", "Show.S01E01-E03.srt", "Show.S02E02.srt", "Show.E02.srt",
+              "Show.S01.Complete.zip", "Show.S02.zip", "Show.1080p.srt"]
+    index = EpisodeIndex([make_item(l) for l in labels])
+    got = [it.filename_text for it in index.candidates(MediaInfo("Show", None, 1, 2))]
+    assert got == ["Show.S01E02.srt", "Show.E02.srt", "Show.S01E01-E03.srt", "Show.S01.Complete.zip"]
+    got = [it.filename_text for it in index.candidates(MediaInfo("Show", None, 1, 4))]
+    assert got == ["Show.S01.Complete.zip"]
+    # Movies keep every item
+    assert len(index.candidates(MediaInfo("Show", 2014, None, None))) == len(labels)
+
+
+def test_zip_pick_uses_episode():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for ep in (1, 2, 3):
+            zf.writestr(f"Show.S01/Show.S01E{ep:02d}.ass", f"ep{ep}")
+    with zipfile.ZipFile(buf) as zf:
+        name, data = _pick_from_zip(zf, "ass", MediaInfo("Show", None, 1, 2))
+    assert name.endswith("S01E02.ass") and data == b"ep2"
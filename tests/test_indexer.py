@@ -0,0 +1,36 @@
+from pathlib import Path
+
+from samfunny import indexer
+from samfunny.filename_parser import parse_media_info
+from samfunny.indexer import ParseCache, index_library
+
+
+NAMES = [
+    "Severance.S01E01.1080p.WEB-DL.mkv",
+    "Severance.S01E02.1080p.WEB-DL.mkv",
+    "Interstellar.2014.1080p.BluRay.x264.mkv",
+]
+
+
+def test_index_matches_parser_and_memoizes(tmp_path: Path, monkeypatch):
+    paths = [tmp_path / n for n in NAMES]
+    cache = ParseCache(tmp_path / "parse_cache.json")
+    rows = index_library(paths, cache, workers=1)
+    for p, row in zip(paths, rows):
+        assert row.path == str(p)
+        assert row.media_info() == parse_media_info(p)
+    cache.save()
+
+    def _fail(names):
+        raise AssertionError(f"reparsed {names}")
+
+    monkeypatch.setattr(indexer, "_parse_chunk", lambda names: _fail(names) if names else [])
+    again = index_library(paths, ParseCache(tmp_path / "parse_cache.json"), workers=1)
+    assert again == rows
+
+
+def test_index_parallel_path(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(indexer, "_MIN_PARALLEL", 1)
+    paths = [tmp_path / f"Severance.S01E{ep:02d}.1080p.mkv" for ep in range(1, 9)]
+    rows = index_library(paths, workers=2, chunk_size=3)
+    assert [r.episode for r in rows] == list(range(1, 9))
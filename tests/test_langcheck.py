@@ -0,0 +1,57 @@
+import io
+import zipfile
+
+import pytest
+
+from samfunny.downloader import _pick_from_zip
+
+from samfunny.langcheck import LanguageMismatch, detect_language, parse_language_list, verify_language
+from samfunny.types import Language
+
+ASS_HEADER = "[Script Info]\nTitle: test\n\n[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+
+
+def _ass(lines):
+    return ASS_HEADER + "".join(
+        f"Dialogue: 0,0:00:0{i}.00,0:00:0{i}.50,Default,,0,0,0,,{text}\n" for i, text in enumerate(lines)
+    )
+
+
+def _srt(lines):
+    return "".join(f"{i + 1}\n00:00:0{i},000 --> 00:00:0{i},500\n{text}\n\n" for i, text in enumerate(lines))
+
+
+def test_detects_tiers():
+    bilingual = _ass(["我们现在就走吧\\N{\\fs12}We should go now", "你说什么\\NWhat did you say"])
+    assert detect_language(bilingual.encode("utf-8")) == Language.BILINGUAL
+    simplified = _srt(["我们现在就走吧", "这个问题没关系", "他说他会来"])
+    assert detect_language(simplified.encode("gb18030")) == Language.SIMPLIFIED
+    traditional = _srt(["我們現在就走吧", "這個問題沒關係", "他說他會來"])
+    assert detect_language(traditional.encode("big5")) == Language.TRADITIONAL
+    english = _srt(["We should go now", "What did you say", "He said he would come"])
+    assert detect_language(english.encode("utf-8-sig")) == Language.ENGLISH
+    # Timecodes and indices alone say nothing about the language
+    assert detect_language(_srt(["", ""]).encode("utf-8")) is None
+
+
+def test_verify_rejects_unwanted_tier():
+    accept = parse_language_list("bilingual,simplified")
+    assert verify_language(_srt(["我们走吧"]).encode("utf-8"), accept) == Language.SIMPLIFIED
+    with pytest.raises(LanguageMismatch):
+        verify_language(_srt(["我們走吧，這個"]).encode("utf-8"), accept)
+    assert parse_language_list("any") is None
+    with pytest.raises(ValueError):
+        parse_language_list("klingon")
+
+
+def test_zip_pick_skips_entries_in_unwanted_language():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        # big5 sorts first, so checking only the first entry would reject the archive
+        zf.writestr("Show.S01E02.big5.srt", _srt(["我們現在就走吧", "這個問題沒關係"]).encode("big5"))
+        zf.writestr("Show.S01E02.gb.srt", _srt(["我们现在就走吧", "这个问题没关系"]).encode("gb18030"))
+    with zipfile.ZipFile(buf) as zf:
+        name, _ = _pick_from_zip(zf, "ass", accept_languages=[Language.SIMPLIFIED])
+        assert name == "Show.S01E02.gb.srt"
+        with pytest.raises(LanguageMismatch):
+            _pick_from_zip(zf, "ass", accept_languages=[Language.ENGLISH])
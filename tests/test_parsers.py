@@ -1,5 +1,6 @@
 from pathlib import Path
 from samfunny.client import _detect_format, _detect_languages
+from samfunny.types import Language
 from bs4 import BeautifulSoup
 
 
@@ -17,7 +18,8 @@ def test_detect_format_and_languages():
     langs = _detect_languages(div)
     fmt = _detect_format(div.get_text(' ', strip=True))
     assert fmt.name in ("SRT", "ASS", "ZIP", "SUP", "OTHER")
-    assert any(l.name == 'BILINGUAL' for l in langs)
+    # A Flag: iterating an instance needs Python 3.11, membership works on 3.10
+    assert Language.BILINGUAL in langs
 
 
 def test_detail_parsing_smoke():
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from samfunny.cache import ResultCache
+from samfunny.fingerprint import content_fingerprint
+from samfunny.pipeline import _check_cache, _record, download_plan
+from samfunny.types import MediaInfo, SubFormat
+
+
+def test_download_plan_streams_three_best_of_each_kind(make_item):
+    items = [make_item(f"a{i}.zip", SubFormat.ZIP, i) for i in range(5)]
+    items += [make_item(f"b{i}.srt", SubFormat.SRT, 100 + i) for i in range(3)]
+    items += [make_item(f"c{i}.ass", SubFormat.ASS, i) for i in range(3)]
+    items.append(make_item("d.ass", SubFormat.ASS, 0))  # ties keep search order
+
+    plan = download_plan(iter(items), "ass")
+    assert [(kind, it.filename_text) for kind, _, it in plan] == [
+        ("ZIP", "a4.zip"), ("ZIP", "a3.zip"), ("ZIP", "a2.zip"),
+        ("Direct", "c2.ass"), ("Direct", "c1.ass"), ("Direct", "c0.ass"),
+    ]
+    # Items sharing a detail page share one URL string
+    assert items[0].detail_url is items[-1].referer
+
+
+def test_cache_failures_do_not_fail_the_video(tmp_path: Path, monkeypatch, make_item):
+    video = tmp_path / "Show.S01E02.mkv"
+    video.write_bytes(b"video")
+    sub = video.with_suffix(".srt")
+    sub.write_bytes(b"subtitle")
+    info = MediaInfo("Show", None, 1, 2)
+    cache = ResultCache(tmp_path / "cache")
+    fp = content_fingerprint(video)
+    cache.record(fp, info, make_item("a.srt", SubFormat.SRT, 1), sub)
+    logged = []
+
+    def denied(*args, **kwargs):
+        raise PermissionError("read-only folder")
+
+    # Placing a cached subtitle fails: a miss, so the caller goes on to search
+    monkeypatch.setattr(cache, "place", denied)
+    assert _check_cache(video, info, cache, False, logged.append) == (fp, None)
+    # Recording a fresh download fails: logged, the placed subtitle stands
+    monkeypatch.setattr(cache, "record", denied)
+    _record(cache, fp, info, make_item("a.srt", SubFormat.SRT, 1), sub, None, logged.append)
+    assert len(logged) == 2 and all("read-only folder" in line for line in logged)
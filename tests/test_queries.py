@@ -0,0 +1,58 @@
+from pathlib import Path
+
+import pytest
+import requests
+
+from samfunny.client import SamfunnyClient
+from samfunny.queries import QueryMemory, plan_queries
+from samfunny.types import MediaInfo
+
+
+def test_plan_queries_variants():
+    media = MediaInfo("人生切割术 Severance", 2022, 1, 2, stem="Severance.S01E02.2022.1080p.WEB-DL")
+    assert plan_queries(media) == ["人生切割术", "Severance", "Severance 2022"]
+    # The stem variant helps when the parsed title is mangled
+    media = MediaInfo("Show S01E02", None, 1, 2, stem="The.Show.S01E02.720p")
+    assert plan_queries(media) == ["Show S01E02", "Show", "The Show"]
+
+
+def test_fanout_merges_variants_and_remembers_winner(tmp_path: Path, standin_site):
+    memory = QueryMemory(tmp_path / "queries.json")
+    client = SamfunnyClient(rate_limit=0, base_url=standin_site.base_url, query_memory=memory)
+    media = MediaInfo("人生切割术 Severance", 2022, 1, 2, stem="人生切割术.Severance.S01E02.2022.1080p")
+
+    items = client.search_and_collect(media, max_pages=1)
+    assert [it.filename_text for it in items] == ["Severance.S01E02.chs&eng.srt"]
+    # The Chinese query found nothing, so the other three variants went out together;
+    # they all list the same detail page, which is fetched once
+    assert standin_site.count("/download/xslist.php") == 4
+    assert standin_site.count("/download/100.html") == 1
+    memory.save()
+
+    # A later run starts from the remembered variant and needs a single list page
+    client = SamfunnyClient(rate_limit=0, base_url=standin_site.base_url,
+                            query_memory=QueryMemory(tmp_path / "queries.json"))
+    items = client.search_and_collect(MediaInfo("人生切割术 Severance", 2022, 1, 3), max_pages=1)
+    assert [it.filename_text for it in items] == ["Severance.S01E03.chs&eng.srt"]
+    assert standin_site.count("/download/xslist.php") == 5
+
+
+def test_failed_search_is_retried_by_next_episode(standin_site):
+    client = SamfunnyClient(rate_limit=0, base_url=standin_site.base_url)
+    standin_site.fail_next("/download/xslist.php")
+    with pytest.raises(requests.HTTPError):
+        client.search_and_collect(MediaInfo("Severance", None, 1, 1), max_pages=1)
+
+    items = client.search_and_collect(MediaInfo("Severance", None, 1, 2), max_pages=1)
+    assert [it.filename_text for it in items] == ["Severance.S01E02.chs&eng.srt"]
+    # The retry is the same single primary query, not a fan-out of every variant
+    assert standin_site.count("/download/xslist.php") == 2
+
+
+def test_variant_detail_pages_are_all_fetched(standin_site):
+    standin_site.detail_pages = [f"/download/{n}.html" for n in (100, 101, 102)]
+    client = SamfunnyClient(rate_limit=0, base_url=standin_site.base_url)
+    # A movie is satisfied by any item, yet the whole first variant is collected for ranking
+    client.search_and_collect(MediaInfo("Severance", None, None, None), max_pages=1)
+    assert [standin_site.count(p) for p in standin_site.detail_pages] == [1, 1, 1]
+    assert standin_site.count("/download/xslist.php") == 1
@@ -0,0 +1,42 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from samfunny.scheduler import Budget, RunState, parse_duration, schedule
+
+
+def _touch(path: Path, age_days: float) -> Path:
+    path.write_bytes(b"")
+    ts = time.time() - age_days * 86400
+    os.utime(path, (ts, ts))
+    return path
+
+
+def test_schedule_orders_by_failure_mtime_and_hit_rate(tmp_path: Path):
+    state = RunState(tmp_path / "state.json")
+    old = _touch(tmp_path / "old.mkv", 10)
+    new_cold = _touch(tmp_path / "cold.mkv", 0)
+    new_hot = _touch(tmp_path / "hot.mkv", 0)
+    failed = _touch(tmp_path / "failed.mkv", 0)
+    series = {old: "a", new_cold: "cold", new_hot: "hot", failed: "a"}
+
+    for _ in range(3):
+        state.series.setdefault("hot", {"hits": 0, "misses": 0})["hits"] += 1
+        state.series.setdefault("cold", {"hits": 0, "misses": 0})["misses"] += 1
+    state.record(failed, "a", ok=False)
+    state.save()
+
+    order = schedule(series, RunState(tmp_path / "state.json"), series.get)
+    assert order == [new_hot, new_cold, old, failed]
+
+
+def test_budget_and_duration():
+    assert parse_duration("90") == 90
+    assert parse_duration("1h30m") == 5400
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+    assert Budget().exhausted(10_000) is None
+    assert "request budget" in Budget(max_requests=5).exhausted(5)
+    assert "deadline" in Budget(deadline=0).exhausted(0)
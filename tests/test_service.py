@@ -0,0 +1,93 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from samfunny.client import SamfunnyClient
+from samfunny.service import SubtitleService, make_server
+from samfunny.types import MediaInfo
+
+
+def _post(url: str, payload: dict) -> dict:
+    req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.loads(resp.read())
+
+
+def test_service_coalesces_concurrent_searches(tmp_path: Path, standin_site):
+    standin_site.delay = 0.2  # keep the first search in flight while the others arrive
+    videos = [tmp_path / f"Severance.S01E{ep:02d}.1080p.mkv" for ep in (1, 2, 3)]
+    for v in videos:
+        v.write_bytes(b"\0" * 1024)
+
+    client = SamfunnyClient(rate_limit=0, base_url=standin_site.base_url)
+    service = SubtitleService(client, max_pages=1)
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/subtitles"
+    try:
+        results: dict = {}
+
+        def call(v: Path):
+            results[v] = _post(url, {"paths": [str(v)]})["results"][0]
+
+        threads = [threading.Thread(target=call, args=(v,)) for v in videos]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for v in videos:
+            assert results[v]["status"] == "placed", results[v]
+            assert Path(results[v]["subtitle"]) == v.with_suffix(".srt")
+            assert v.with_suffix(".srt").read_text(encoding="utf-8").startswith("1\n")
+        assert standin_site.count("/download/xslist.php") == 1
+
+        again = _post(url, {"paths": [str(videos[0]), str(tmp_path / "missing.mkv")]})["results"]
+        assert [r["status"] for r in again] == ["exists", "missing"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_service_rejects_non_object_body_and_expires_searches(standin_site):
+    client = SamfunnyClient(rate_limit=0, base_url=standin_site.base_url)
+    server = make_server(SubtitleService(client, max_pages=1, search_ttl=60), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    req = urllib.request.Request(f"http://127.0.0.1:{server.server_port}/subtitles", data=b'["a"]')
+    try:
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            urllib.request.urlopen(req, timeout=10)
+        assert exc.value.code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Searches older than search_ttl are dropped when any other series is looked up
+    client.search_and_collect(MediaInfo("Severance", None, 1, 1), max_pages=1)
+    (old,) = client._searches.values()
+    old.created -= 120
+    client.search_and_collect(MediaInfo("Other", None, 1, 1), max_pages=1)
+    assert old not in client._searches.values() and len(client._searches) == 1
+
+
+def test_service_reports_failed_commit(tmp_path: Path, standin_site, monkeypatch):
+    video = tmp_path / "Severance.S01E01.1080p.mkv"
+    video.write_bytes(b"\0" * 1024)
+    replace = os.replace
+
+    def failing_replace(src, dst):
+        if str(dst).endswith(".srt"):
+            raise PermissionError("read-only folder")
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    service = SubtitleService(SamfunnyClient(rate_limit=0, base_url=standin_site.base_url), max_pages=1)
+    (result,) = service.handle([str(video)])
+    assert result["status"] == "failed" and result["error"]
+    assert not video.with_suffix(".srt").exists()
@@ -0,0 +1,110 @@
+import os
+import time
+from pathlib import Path
+
+from samfunny.scheduler import RunState
+from samfunny.store import TMP_SUFFIX, BatchWriter, SubtitleStore, cleanup_temp_files, write_if_changed
+
+
+def test_store_dedups_and_places_siblings(tmp_path: Path):
+    store = SubtitleStore(tmp_path / "store")
+    data = b"1\n00:00:01,000 --> 00:00:02,000\nhi\n"
+    d1 = store.put(data)
+    assert store.put(data) == d1 and store.read(d1) == data
+
+    a = tmp_path / "Show.S01E02.1080p.srt"
+    b = tmp_path / "Show.S01E02.2160p.srt"
+    assert store.place(d1, a) is True
+    assert store.place(d1, b) is True
+    assert a.read_bytes() == b.read_bytes() == data
+    # Second placement of unchanged content is a no-op
+    assert store.place(d1, a) is False
+    assert not [p for p in tmp_path.iterdir() if p.name.endswith(TMP_SUFFIX)]
+
+    # A placed subtitle is an independent, writable file: editing it leaves the store alone
+    assert os.stat(a).st_nlink == 1 and os.access(a, os.W_OK)
+    with open(a, "r+b") as f:
+        f.write(b"2")
+    assert store.read(d1) == data and b.read_bytes() == data
+
+
+def test_write_if_changed_skips_identical(tmp_path: Path):
+    p = tmp_path / "x.ass"
+    assert write_if_changed(p, b"abc") is True
+    mtime = os.stat(p).st_mtime_ns
+    assert write_if_changed(p, b"abc") is False
+    assert os.stat(p).st_mtime_ns == mtime
+    assert write_if_changed(p, b"abcd") is True
+
+
+def test_batch_writer_commits_per_directory(tmp_path: Path):
+    state = RunState(tmp_path / "state.json")
+    on_disk = []
+
+    def save_state():
+        state.save()
+        on_disk.append(RunState(tmp_path / "state.json").subtitles)
+
+    writer = BatchWriter(batch_size=2, on_stage=state.mark_partial, on_commit=state.mark_complete,
+                         before_commit=save_state)
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.mkdir()
+    b.mkdir()
+
+    write_if_changed(a / "1.srt", b"one", writer)
+    write_if_changed(b / "1.srt", b"uno", writer)
+    # Staged only: nothing at the destinations yet, and the run state says partial
+    assert not (a / "1.srt").exists() and writer.read(a / "1.srt") == b"one"
+    assert not state.subtitle_complete(a / "1.srt")
+
+    write_if_changed(a / "2.srt", b"two", writer)  # fills directory a's batch
+    assert (a / "1.srt").read_bytes() == b"one" and (a / "2.srt").read_bytes() == b"two"
+    assert state.subtitle_complete(a / "2.srt") and not (b / "1.srt").exists()
+
+    writer.flush()
+    assert (b / "1.srt").read_bytes() == b"uno" and state.subtitle_complete(b / "1.srt")
+    assert not [p for d in (a, b) for p in d.iterdir() if p.name.endswith(TMP_SUFFIX)]
+
+    # The partial markers were on disk before each directory's renames
+    assert on_disk[0] == {str(a / "1.srt"): "partial", str(b / "1.srt"): "partial", str(a / "2.srt"): "partial"}
+    assert on_disk[1][str(b / "1.srt")] == "partial" and on_disk[1][str(a / "2.srt")] == "complete"
+
+
+def test_cleanup_removes_only_stale_temp_files(tmp_path: Path):
+    stale = tmp_path / f".Show.S01E01.ass.123.456{TMP_SUFFIX}"
+    fresh = tmp_path / f".Show.S01E02.ass.123.456{TMP_SUFFIX}"
+    for p in (stale, fresh):
+        p.write_bytes(b"partial")
+    old = time.time() - 2 * 3600
+    os.utime(stale, (old, old))
+
+    assert cleanup_temp_files([tmp_path]) == 1
+    assert not stale.exists() and fresh.exists()
+
+
+def test_failed_commit_stays_partial(tmp_path: Path, capsys):
+    state = RunState(tmp_path / "state.json")
+    writer = BatchWriter(on_stage=state.mark_partial, on_commit=state.mark_complete)
+    blocked = tmp_path / "Show.S01E01.srt"
+    (blocked / "x").mkdir(parents=True)  # a non-empty directory cannot be replaced by a file
+
+    write_if_changed(blocked, b"one", writer)
+    write_if_changed(tmp_path / "Show.S01E02.srt", b"two", writer)
+    writer.flush()
+
+    assert writer.failed == [blocked] and "Failed to write" in capsys.readouterr().out
+    assert not state.subtitle_complete(blocked)
+    assert state.subtitle_complete(tmp_path / "Show.S01E02.srt")
+    assert not [p for p in tmp_path.iterdir() if p.name.endswith(TMP_SUFFIX)]
+
+
+def test_store_objects_are_synced_before_use(tmp_path: Path, monkeypatch):
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd) or fsync(fd))
+    store = SubtitleStore(tmp_path / "store")
+    digest = store.put(b"subtitle")
+    # The object's bytes and then its shard directory
+    assert len(synced) == (1 if os.name == "nt" else 2)
+    assert store.read(digest) == b"subtitle"
+    assert not [p for p in store.object_path(digest).parent.iterdir() if p.name.endswith(TMP_SUFFIX)]